@@ -0,0 +1,159 @@
+"""Birthday analytics for the whole book computed with NumPy.
+
+All birthdays are loaded once into a datetime64 array, after that every aggregate
+(distribution by month and by weekday of the next birthday, number of birthdays in
+the next 7/30/90 days, age buckets) is a few vectorized operations instead of
+a loop over records.
+
+Usage:
+    python analytics.py data.csv [--csv report.csv]
+"""
+import argparse
+import csv
+from datetime import date
+
+import numpy as np
+
+import classes
+import handlers
+
+
+UPCOMING_DAYS = (7, 30, 90)
+# Межі вікових груп: [0, 18), [18, 25), ... [65, ...)
+AGE_EDGES = (0, 18, 25, 35, 45, 55, 65)
+MONTHS = ("January", "February", "March", "April", "May", "June", "July",
+          "August", "September", "October", "November", "December")
+WEEKDAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
+
+def _dates(years, months, days):
+    """Return datetime64[D] array from arrays of years, months and days. A day that
+    doesn't exist in the month (29 February in a non-leap year) becomes the last day."""
+    month_starts = ((years - 1970) * 12 + months - 1).astype("datetime64[M]")
+    month_lengths = ((month_starts + 1).astype("datetime64[D]")
+                     - month_starts.astype("datetime64[D]")).astype(int)
+    return month_starts.astype("datetime64[D]") + (np.minimum(days, month_lengths) - 1)
+
+
+class BirthdayAnalytics:
+    def __init__(self, birthdays, today=None):
+        """Take as input datetime64[D] array of birthdays and the current date."""
+        self.birthdays = np.asarray(birthdays, dtype="datetime64[D]")
+        self.today = np.datetime64(today or date.today(), "D")
+        years = self.birthdays.astype("datetime64[Y]").astype(int) + 1970
+        self.months = self.birthdays.astype("datetime64[M]").astype(int) % 12 + 1
+        days = (self.birthdays - self.birthdays.astype("datetime64[M]")).astype(int) + 1
+        # День народження цього та наступного року. Як і в next_birthday,
+        # 29 лютого у невисокосний рік святкується 28 лютого
+        current_year = self.today.astype("datetime64[Y]").astype(int) + 1970
+        this_year = _dates(np.full_like(years, current_year), self.months, days)
+        next_year = _dates(np.full_like(years, current_year + 1), self.months, days)
+        self.next_birthdays = np.where(this_year < self.today, next_year, this_year)
+        self.days_left = (self.next_birthdays - self.today).astype(int)
+        # Якщо день народження цього року ще не настав, людині на рік менше
+        self.ages = current_year - years - (this_year > self.today)
+
+    @classmethod
+    def from_book(cls, book, today=None):
+        """Take as input AddressBook or SQLiteAddressBook. Return BirthdayAnalytics
+        for all records with a birthday."""
+        parts = []
+        for record in book.records():
+            # Відсутні та неіснуючі дати(31.02 з пошкодженого файлу) пропускаються,
+            # так само як і в календарному індексі книги
+            month_day = record.birthday.month_day
+            if month_day is not None:
+                parts.append((record.birthday.year, *month_day))
+        parts = np.array(parts, dtype=np.int64).reshape(-1, 3)
+        return cls(_dates(parts[:, 0], parts[:, 1], parts[:, 2]), today)
+
+    def __len__(self):
+        return len(self.birthdays)
+
+    def by_month(self):
+        """Return dict {month name: number of birthdays}."""
+        return dict(zip(MONTHS, np.bincount(self.months - 1, minlength=12).tolist()))
+
+    def by_weekday(self):
+        """Return dict {weekday name: number of next birthdays on this weekday}."""
+        # 1 січня 1970 року був четвер, тому до номера дня додається 3
+        weekdays = (self.next_birthdays.astype(int) + 3) % 7
+        return dict(zip(WEEKDAYS, np.bincount(weekdays, minlength=7).tolist()))
+
+    def upcoming(self, periods=UPCOMING_DAYS):
+        """Return dict {number of days: number of birthdays from today to today + days}."""
+        return {days: int(np.count_nonzero(self.days_left <= days)) for days in periods}
+
+    def age_buckets(self, edges=AGE_EDGES):
+        """Return dict {age group: number of users of this age}."""
+        labels = [f"{low}-{high - 1}" for low, high in zip(edges, edges[1:])] + [f"{edges[-1]}+"]
+        counts = np.bincount(np.digitize(self.ages, edges[1:]), minlength=len(labels))
+        return dict(zip(labels, counts.tolist()))
+
+    def rows(self):
+        """Return list of (section, key, count) rows of the whole report."""
+        result = [("total", "birthdays", len(self))]
+        result += [("month", key, count) for key, count in self.by_month().items()]
+        result += [("weekday", key, count) for key, count in self.by_weekday().items()]
+        result += [("next days", key, count) for key, count in self.upcoming().items()]
+        result += [("age", key, count) for key, count in self.age_buckets().items()]
+        return result
+
+    def report(self):
+        """Return the report as text."""
+        if not len(self):
+            return "There are no birthdays in the book."
+        lines = [f"Birthdays: {len(self)}."]
+        titles = {"month": "By month:", "weekday": "Next birthdays by weekday:",
+                  "next days": "In the next days:", "age": "By age:"}
+        section = None
+        for row_section, key, count in self.rows()[1:]:
+            if row_section != section:
+                section = row_section
+                lines.append(titles[section])
+            lines.append(f"    {key}: {count}")
+        return "\n".join(lines)
+
+    def write_csv(self, filename):
+        with open(filename, "w", newline="", encoding="utf-8") as file:
+            writer = csv.writer(file)
+            writer.writerow(["Section", "Key", "Count"])
+            writer.writerows(self.rows())
+
+
+# Обробник реєструється у handlers як лінивий, тому numpy завантажується
+# лише при першому виклику команди birthdays report. Опис команди для help
+# задається там же, при реєстрації
+@handlers.input_error
+def report_handler(*args):
+    analytics = BirthdayAnalytics.from_book(handlers.session.book)
+    if not args:
+        return analytics.report()
+    if args[0].lower() != "csv":
+        raise ValueError
+    filename = " ".join(args[1:])
+    if not filename:
+        raise IndexError
+    # Помилку запису файлу не перехоплює input_error, тому вона обробляється тут
+    try:
+        analytics.write_csv(filename)
+    except OSError as error:
+        handlers.stats.record_error("birthdays report", error)
+        return f"Could not save the birthday report to {filename}: {error.strerror or error}."
+    return f"Birthday report saved to {filename}."
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show birthday analytics of the address book.")
+    parser.add_argument("filename", help="csv file of the address book")
+    parser.add_argument("--csv", metavar="FILE", help="save the report to FILE")
+    args = parser.parse_args()
+    analytics = BirthdayAnalytics.from_book(classes.AddressBook.open_file(args.filename))
+    if args.csv:
+        analytics.write_csv(args.csv)
+    else:
+        print(analytics.report())
+
+
+if __name__ == "__main__":
+    main()
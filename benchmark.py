@@ -0,0 +1,186 @@
+"""Benchmarks for the hot paths of the address book:
+AddressBook.open_file, write_to_csv, search, Record.add_phone and main.parse_command.
+
+Usage:
+    python benchmark.py [--sizes 1000 100000 1000000] [--output results.json]
+                        [--compare baseline.json] [--threshold 0.2] [--no-memory]
+
+For every operation and book size the wall time, operations per second and peak memory
+are reported. Results can be saved as JSON and compared with a previous run: operations
+that became slower by more than the threshold are reported as regressions.
+"""
+import argparse
+from datetime import date, timedelta
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import classes
+
+
+DEFAULT_SIZES = (1_000, 100_000)
+SYLLABLES = ("vo", "lo", "dy", "myr", "an", "na", "ka", "te", "ri", "na", "ol", "ha",
+             "se", "rhii", "iv", "an", "ma", "ks", "ym", "yu", "li", "ia", "pe", "tro")
+
+
+def generate_records(size, seed=0):
+    """Yield size synthetic records with unique names, 1-3 phones and optional birthday."""
+    generator = random.Random(seed)
+    first_birthday = date(1940, 1, 1)
+    for i in range(size):
+        name = "".join(generator.choice(SYLLABLES)
+                       for _ in range(generator.randint(2, 4))).capitalize()
+        phones = [classes.Phone(("+" if generator.random() < 0.3 else "")
+                                + str(generator.randint(10 ** 11, 10 ** 12 - 1)))
+                  for _ in range(generator.randint(1, 3))]
+        birthday = ""
+        if generator.random() < 0.7:
+            day = first_birthday + timedelta(days=generator.randint(0, 365 * 65))
+            birthday = day.strftime("%d.%m.%Y")
+        yield classes.Record(classes.Name(f"{name}{i}"), phones, classes.Birthday(birthday))
+
+
+def generate_book(size, seed=0):
+    book = classes.AddressBook()
+    book.import_records(generate_records(size, seed))
+    return book
+
+
+class Benchmark:
+    def __init__(self, measure_memory=True):
+        self.measure_memory = measure_memory
+        self.results = []
+
+    def run(self, size, operation, function, repeat=1):
+        """Run function repeat times and remember time, speed and peak memory."""
+        start = time.perf_counter()
+        for _ in range(repeat):
+            function()
+        seconds = time.perf_counter() - start
+        peak = None
+        # Пам'ять вимірюється окремим запуском, бо tracemalloc суттєво
+        # сповільнює код і спотворив би вимірювання часу
+        if self.measure_memory:
+            tracemalloc.start()
+            function()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        result = {"size": size, "operation": operation, "repeat": repeat,
+                  "seconds": round(seconds, 6),
+                  "ops_per_second": round(repeat / seconds, 2) if seconds else None,
+                  "peak_memory_bytes": peak}
+        self.results.append(result)
+        print(f"{size:>9} {operation:<30} {seconds:>10.4f} s {result['ops_per_second'] or 0:>14.1f} ops/s"
+              + (f" {peak / 2 ** 20:>10.1f} MiB" if peak is not None else ""))
+        return result
+
+
+def run_size(benchmark, size, directory):
+    filename = os.path.join(directory, f"data_{size}.csv")
+    book = generate_book(size)
+    names = list(book.data)
+    sample = random.Random(1).sample(names, min(100, len(names)))
+    # Для вимірювань, що повторюються, кількість повторів зменшується
+    # зі зростанням книги, щоб один прогін не тривав годинами
+    repeat = max(1, 100_000 // size)
+
+    benchmark.run(size, "write_to_csv", lambda: book.write_to_csv(filename))
+    benchmark.run(size, "open_file", lambda: classes.AddressBook.open_file(filename))
+
+    queries = [name[:5] for name in sample[:10]] + ["ka", "23", "456", "+38"]
+
+    # Кеш пошуку очищується перед кожним запитом, інакше після першого проходу
+    # вимірювався б лише кеш, а не індекс. Пошук з кешем вимірюється окремо
+    def search(field, cached=False):
+        def run():
+            for text in queries:
+                if not cached:
+                    book.search_cache.clear()
+                book.search(field, text)
+        return run
+
+    benchmark.run(size, "search name (x14)", search("name"), repeat)
+    benchmark.run(size, "search phone (x14)", search("phone"), repeat)
+    benchmark.run(size, "search name cached (x14)", search("name", cached=True), repeat)
+    benchmark.run(size, "search phone cached (x14)", search("phone", cached=True), repeat)
+
+    def add_phone():
+        for name in sample:
+            book[name].add_phone(classes.Phone("123456789012"))
+            book[name].delete_phone(classes.Phone("123456789012"))
+
+    benchmark.run(size, "add_phone+delete_phone (x100)", add_phone, repeat)
+
+    try:
+        import handlers
+        import main
+    except ImportError as error:
+        print(f"{size:>9} parse_command skipped: {error}")
+        return
+    # parse_command працює з окремою сесією над згенерованою книгою,
+    # зміни у файл не записуються
+    session = classes.AddressBookSession(filename, flush_interval=float("inf"))
+    old_session, handlers.session = handlers.session, session
+    commands = [f"phone {name}" for name in sample] + ["search name ka", "owner 123456789012"]
+    try:
+        session.book
+        benchmark.run(size, f"parse_command (x{len(commands)})",
+                      lambda: [main.parse_command(command) for command in commands], repeat)
+    finally:
+        handlers.session = old_session
+
+
+def compare(results, baseline, threshold):
+    """Return list of messages about operations slower than in baseline by more than threshold."""
+    previous = {(item["size"], item["operation"]): item for item in baseline["results"]}
+    regressions = []
+    for item in results:
+        old = previous.get((item["size"], item["operation"]))
+        if not old or not old["ops_per_second"] or not item["ops_per_second"]:
+            continue
+        change = item["ops_per_second"] / old["ops_per_second"] - 1
+        if change < -threshold:
+            regressions.append(f"{item['operation']} on {item['size']} records: "
+                               f"{old['ops_per_second']} -> {item['ops_per_second']} ops/s "
+                               f"({change * 100:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the address book hot paths.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="book sizes, for example 1000 100000 1000000")
+    parser.add_argument("--output", help="save results to this JSON file")
+    parser.add_argument("--compare", metavar="BASELINE", help="JSON file of a previous run")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed slowdown compared with the baseline (0.2 = 20%%)")
+    parser.add_argument("--no-memory", action="store_true", help="don't measure peak memory")
+    args = parser.parse_args()
+
+    benchmark = Benchmark(measure_memory=not args.no_memory)
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            run_size(benchmark, size, directory)
+
+    report = {"python": platform.python_version(), "platform": platform.platform(),
+              "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": benchmark.results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            regressions = compare(benchmark.results, json.load(file), args.threshold)
+        for message in regressions:
+            print(f"REGRESSION: {message}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
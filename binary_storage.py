@@ -0,0 +1,211 @@
+"""Binary storage format for the address book.
+
+File layout (all numbers are little-endian):
+    header:  magic b"ABK1", version (u16), number of records (u32), offset of the index (u64)
+    records: for each record u32 payload length and the payload itself - utf-8 string
+             "name<US>phone<RS>phone<US>birthday", where US is \\x1f and RS is \\x1e
+    index:   u64 offsets of the records, ordered by name
+
+The file is opened with mmap, so opening does not depend on the size of the book:
+only the header is read, and a record is decoded when it is accessed.
+
+This is a standalone read-only snapshot format for tools that need fast lookups by
+name or an export of the book, not a storage backend of AddressBookSession. Commands
+of the bot use indexes (phone owners, birthdays, substring and fuzzy search) that
+would have to be built from every record after opening the file, which takes most
+of the startup time anyway. For a book that starts quickly and keeps its indexes
+on disk use the SQLite backend (a data file with extension .db).
+
+Usage:
+    python binary_storage.py to-binary data.csv data.abk
+    python binary_storage.py to-csv data.abk data.csv
+"""
+import argparse
+import csv
+import mmap
+import os
+import struct
+
+import classes
+
+
+MAGIC = b"ABK1"
+VERSION = 1
+HEADER = struct.Struct("<4sHIQ")
+LENGTH = struct.Struct("<I")
+OFFSET = struct.Struct("<Q")
+FIELD_SEPARATOR = "\x1f"
+PHONE_SEPARATOR = "\x1e"
+
+
+class WrongFileFormat(Exception):
+    pass
+
+
+def encode_record(record):
+    phones = PHONE_SEPARATOR.join(phone.value for phone in record.phones)
+    payload = FIELD_SEPARATOR.join((record.name.value, phones, str(record.birthday)))
+    payload = payload.encode("utf-8")
+    return LENGTH.pack(len(payload)) + payload
+
+
+def decode_record(payload):
+    name, phones, birthday = payload.decode("utf-8").split(FIELD_SEPARATOR)
+    phones = [classes.Phone(phone) for phone in phones.split(PHONE_SEPARATOR) if phone]
+    return classes.Record(classes.Name(name), phones, classes.Birthday(birthday))
+
+
+def write_binary(records, filename):
+    """Take as input iterable of Record and filename. Write records in the binary format."""
+    # Записи впорядковуються за іменем, тоді індекс зсувів теж впорядкований
+    # і запис можна знайти бінарним пошуком
+    records = sorted(records, key=lambda record: record.name.value)
+    tmp_filename = f"{filename}.tmp"
+    with open(tmp_filename, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, 0, 0))
+        offsets = []
+        for record in records:
+            offsets.append(file.tell())
+            file.write(encode_record(record))
+        index_offset = file.tell()
+        for offset in offsets:
+            file.write(OFFSET.pack(offset))
+        file.seek(0)
+        file.write(HEADER.pack(MAGIC, VERSION, len(offsets), index_offset))
+    os.replace(tmp_filename, filename)
+
+
+class MappedAddressBook:
+    """Read-only address book over a file in the binary format.
+    Supports lookup by name, iteration, search and paging like AddressBook.
+    Changes are not supported: write a new file with write_binary instead."""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._file = open(filename, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, self._count, self._index_offset = HEADER.unpack_from(self._map, 0)
+        except (ValueError, struct.error):
+            self._file.close()
+            raise WrongFileFormat(f"{filename} is not an address book file")
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise WrongFileFormat(f"{filename} is not an address book file")
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def _offset(self, position):
+        return OFFSET.unpack_from(self._map, self._index_offset + position * OFFSET.size)[0]
+
+    def _payload(self, position):
+        offset = self._offset(position)
+        length = LENGTH.unpack_from(self._map, offset)[0]
+        start = offset + LENGTH.size
+        return self._map[start:start + length]
+
+    def _name(self, position):
+        payload = self._payload(position)
+        return payload[:payload.index(FIELD_SEPARATOR.encode())].decode("utf-8")
+
+    def _find(self, name):
+        # Бінарний пошук по індексу. Для порівняння декодується лише ім'я запису
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._name(middle) < name:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self._count and self._name(low) == name:
+            return low
+        return None
+
+    def __getitem__(self, name):
+        position = self._find(name)
+        if position is None:
+            raise KeyError(name)
+        return decode_record(self._payload(position))
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def __contains__(self, name):
+        return self._find(name) is not None
+
+    def keys(self):
+        for position in range(self._count):
+            yield self._name(position)
+
+    def values(self):
+        for position in range(self._count):
+            yield decode_record(self._payload(position))
+
+    def search(self, field: str, text: str) -> list[classes.Record]:
+        result = []
+        for record in self.values():
+            if field.lower() == "name":
+                values = [record.name.value]
+            elif field.lower() == "phone":
+                values = [phone.value for phone in record.phones]
+            else:
+                return []
+            if any(text in value for value in values):
+                result.append(record)
+        return result
+
+    def pages(self, page_size=None):
+        return classes.PageCursor(self.values, self._count,
+                                  page_size or classes.AddressBook.page_size)
+
+    def to_address_book(self):
+        data = classes.AddressBook()
+        for record in self.values():
+            data.add_record(record)
+        return data
+
+
+def csv_to_binary(csv_filename, binary_filename):
+    # open_file також застосовує журнал змін, тому у двійковий файл
+    # потрапляє актуальний стан книги
+    write_binary(classes.AddressBook.open_file(csv_filename).data.values(), binary_filename)
+
+
+def binary_to_csv(binary_filename, csv_filename):
+    with MappedAddressBook(binary_filename) as data:
+        with open(csv_filename, "w", newline="", encoding="utf-8") as file:
+            writer = csv.DictWriter(file, fieldnames=classes.AddressBook.fieldnames)
+            writer.writeheader()
+            for record in data.values():
+                writer.writerow(classes.AddressBook.record_to_row(record))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert the address book between "
+                                                 "csv and binary formats.")
+    parser.add_argument("direction", choices=("to-binary", "to-csv"))
+    parser.add_argument("source")
+    parser.add_argument("destination")
+    args = parser.parse_args()
+    if args.direction == "to-binary":
+        csv_to_binary(args.source, args.destination)
+    else:
+        binary_to_csv(args.source, args.destination)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,15 @@
+import calendar
 from collections import UserDict
 import csv
 from datetime import datetime, date
+from itertools import islice
+import os
 import re
+import sys
+import threading
+import time
+
+from indexes import FuzzyIndex, LRUCache, NGramIndex, ReverseIndex, SortedIndex
 
 
 class WrongPhone(Exception):
@@ -12,7 +20,24 @@ class WrongDate(Exception):
     pass
 
 
+def next_birthday(month, day, today):
+    """Take as input month and day of birth and the current date.
+    Return the date of the nearest birthday that is not earlier than today."""
+    for year in (today.year, today.year + 1):
+        # У невисокосний рік день народження 29 лютого святкують 28 лютого
+        if (month, day) == (2, 29) and not calendar.isleap(year):
+            birthday = date(year, 2, 28)
+        else:
+            birthday = date(year, month, day)
+        if birthday >= today:
+            return birthday
+
+
 class Field:
+    # __slots__ прибирає у кожного екземпляра словник __dict__. На мільйонах
+    # контактів це суттєво зменшує використання пам'яті
+    __slots__ = ("_value",)
+
     def __init__(self, value):
         self._value = value
 
@@ -34,6 +59,8 @@ class Field:
     
     
 class Name(Field):
+    __slots__ = ()
+
     @property
     def value(self):
         return self._value
@@ -44,6 +71,7 @@ class Name(Field):
         
 
 class Phone(Field):
+    __slots__ = ()
 
     @staticmethod
     def is_valid_phone(phone):
@@ -53,6 +81,12 @@ class Phone(Field):
         match = re.search(r"^\+?[1-9][\d]{11}$", phone)
         return bool(match)
 
+    @staticmethod
+    def normalize(phone):
+        # +123456987456 та 123456987456 це один і той самий номер,
+        # тому для порівняння номерів залишаються лише цифри
+        return re.sub(r"\D", "", str(phone))
+
     @property
     def value(self):
         return self._value
@@ -67,6 +101,7 @@ class Phone(Field):
 
 
 class Birthday(Field):
+    __slots__ = ()
 
     @staticmethod
     def is_valid_date(date):
@@ -89,12 +124,49 @@ class Birthday(Field):
         else:
             raise WrongDate("Invalid date. Please enter birthday in format 'DD.MM.YYYY'.")
 
+    def _parts(self):
+        # Замість повільного strptime рядок просто розбивається. Дата, прочитана
+        # з файлу, не перевірялася при введенні, тому неіснуючий день(31.02)
+        # відкидається так само, як і відсутній день народження
+        try:
+            day, month, year = map(int, self._value.split("."))
+        except (AttributeError, ValueError):
+            return None
+        if not 1 <= month <= 12 or not 1 <= day <= calendar.monthrange(year, month)[1]:
+            return None
+        return day, month, year
+
+    @property
+    def month_day(self):
+        """Return (month, day) of the birthday or None if there is no birthday
+        or the date doesn't exist."""
+        parts = self._parts()
+        return None if parts is None else (parts[1], parts[0])
+
+    @property
+    def year(self):
+        """Return year of the birthday or None, in the same cases as month_day."""
+        parts = self._parts()
+        return None if parts is None else parts[2]
+
 
 class Record:
+    __slots__ = ("name", "phones", "birthday", "book")
+
     def __init__(self, name, phones=None, birthday=None):
         self.name = name
-        self.phones = phones
-        self.birthday = birthday
+        # Запис може створюватися з одним номером, зі списком номерів або взагалі без них.
+        # Тепер записи довго живуть у пам'яті сесії, тому phones завжди має бути списком,
+        # а birthday - екземпляром Birthday
+        if phones is None:
+            phones = []
+        elif isinstance(phones, Phone):
+            phones = [phones]
+        self.phones = list(phones)
+        self.birthday = birthday if birthday is not None else Birthday("")
+        # Адресна книга, у якій зберігається запис. Через це посилання запис
+        # повідомляє книгу про зміну телефонів, щоб вона оновила свої індекси
+        self.book = None
 
     def __str__(self):
         # Рядкове представлення Record у форматі 
@@ -106,127 +178,660 @@ class Record:
     def __repr__(self):
         return str(self)
 
+    # Методи нижче не змінюють self.phones на місці, а завжди присвоюють новий список.
+    # Так вони однаково працюють і з Record, і з CompactRecord, у якого phones
+    # це властивість, що кожного разу створює новий список
     def add_phone(self, phone: Phone):
-        self.phones.append(phone)
+        phones = self.phones
+        phones.append(phone)
         # Список телефонів приводиться до множини для того, щоб виключити можливість 
         # повторення номеру телефону
-        self.phones = list(set(self.phones))
+        self.phones = list(set(phones))
+        self._phones_changed()
         return f"Phone number {phone} for user {self.name.value} added successfully."
 
     def change_phone(self, old_number: Phone, new_number: Phone):
         # У списку телефонів знаходиться індекс старого номера та змінює 
         # old_number на new_number
-        if old_number not in self.phones:
+        phones = self.phones
+        if old_number not in phones:
             return f"Number {old_number} not found."
         else:
-            phone_number_index = self.phones.index(old_number)
-            self.phones[phone_number_index] = new_number
+            phone_number_index = phones.index(old_number)
+            phones[phone_number_index] = new_number
+            self.phones = phones
+            self._phones_changed()
             return f"The phone number {old_number} for the user {self.name} "\
                 f"has been changed to {new_number}"
 
     def delete_phone(self, phone):
+        phones = self.phones
         try:
-            self.phones.remove(phone)
+            phones.remove(phone)
+            self.phones = phones
+            self._phones_changed()
             return f"Phone number {phone} for user {self.name} deleted successfully."
         except ValueError:
             return f"Phone number {phone} for user {self.name} not found"
 
+    def _phones_changed(self):
+        if self.book is not None:
+            self.book.phones_changed(self)
+
     def days_to_birthday(self):
-        try:
-            birthday = datetime.strptime(str(self.birthday), "%d.%m.%Y").date()
-        except ValueError:
+        month_day = self.birthday.month_day
+        if month_day is None:
             return f"No birthday for user {self.name.value}"
-        
+
         today = date.today()
-        birthday = birthday.replace(year=today.year)
         # Якщо цього року вже був день народження, кількість днів рахується до наступного 
         # дня народження
-        if birthday < today:
-            birthday = birthday.replace(year=today.year+1)
+        birthday = next_birthday(*month_day, today)
         result = (birthday - today).days
         birthday_str = birthday.strftime("%d %B")
         return f"The birthday of user {self.name} will be in {result} days, {birthday_str}"
 
 
+class CompactRecord(Record):
+    """Record that keeps its data packed: name as interned str, phones as a tuple of ints
+    and birthday as a date ordinal. Name, Phone and Birthday objects are created
+    only when the corresponding attribute is read."""
+
+    __slots__ = ()
+
+    # Використовуються ті самі слоти, що й у Record, але у них зберігаються
+    # упаковані значення. Доступ до слотів відбувається через ці дескриптори,
+    # а атрибути name, phones та birthday стають властивостями
+    _name = Record.name
+    _phones = Record.phones
+    _birthday = Record.birthday
+
+    @classmethod
+    def from_record(cls, record):
+        return cls(record.name, record.phones, record.birthday)
+
+    @property
+    def name(self):
+        return Name(self._name)
+
+    @name.setter
+    def name(self, name):
+        self._name = sys.intern(name.value)
+
+    @property
+    def phones(self):
+        return [Phone(self._unpack_phone(phone)) for phone in self._phones]
+
+    @phones.setter
+    def phones(self, phones):
+        self._phones = tuple(self._pack_phone(phone.value) for phone in phones)
+
+    @property
+    def birthday(self):
+        value = self._birthday
+        if isinstance(value, int):
+            if not value:
+                return Birthday("")
+            value = date.fromordinal(value)
+            value = f"{value.day:02}.{value.month:02}.{value.year:04}"
+        return Birthday(value)
+
+    @birthday.setter
+    def birthday(self, birthday):
+        try:
+            day, month, year = map(int, birthday.value.split("."))
+            self._birthday = date(year, month, day).toordinal()
+        except (AttributeError, ValueError):
+            # Порожній день народження зберігається як 0, а значення, яке не вдалося
+            # розібрати(наприклад, з пошкодженого файлу), зберігається як є
+            self._birthday = birthday.value or 0
+
+    # Номер +123456987456 зберігається як від'ємне число -123456987456, а 123456987456
+    # як додатне. Номер, що не є числом без провідних нулів, зберігається рядком
+    @staticmethod
+    def _pack_phone(phone):
+        digits = phone[1:] if phone.startswith("+") else phone
+        if not digits.isdigit() or digits.startswith("0"):
+            return phone
+        return -int(digits) if phone.startswith("+") else int(digits)
+
+    @staticmethod
+    def _unpack_phone(phone):
+        if isinstance(phone, str):
+            return phone
+        return f"+{-phone}" if phone < 0 else str(phone)
+
+
 class AddressBook(UserDict):
+    fieldnames = ["Name", "Phone numbers", "Birthday"]
+    journal_fieldnames = ["Operation"] + fieldnames
+    # Кількість рядків у журналі змін, що ще не перенесені у основний файл
+    journal_length = 0
+    # Кількість записів на одній сторінці при перегляді книги
+    page_size = 10
+    # Скільки останніх результатів пошуку зберігається у кеші
+    search_cache_size = 256
+
+    def __init__(self, *args, compact_storage=False, **kwargs):
+        # У компактному режимі всі записи зберігаються як CompactRecord
+        self.compact_storage = compact_storage
+        # Індекси n-грам для пошуку за частиною імені чи номеру телефону.
+        # Вони мають існувати до виклику конструктора UserDict, бо той
+        # додає початкові дані через __setitem__
+        self.name_index = NGramIndex()
+        self.phone_index = NGramIndex()
+        # Зворотний індекс {нормалізований номер: імена власників}
+        self.phone_owners = ReverseIndex(Phone.normalize)
+        # Календарний індекс: імена, впорядковані за (місяць, день) народження
+        self.birthdays = SortedIndex()
+        # Імена в алфавітному порядку без урахування регістру - для show all,
+        # запитів за діапазоном імен та посторінкового перегляду
+        self.sorted_names = SortedIndex()
+        # Індекс для пошуку з помилками будується при першому нечіткому пошуку,
+        # після чого оновлюється разом з іншими індексами
+        self.fuzzy_names = None
+        # Кеш {(поле, текст): імена знайдених записів} для повторюваних запитів search
+        self.search_cache = LRUCache(self.search_cache_size)
+        super().__init__(*args, **kwargs)
+
+    # Усі зміни словника (add_record, delete_record, change_record, open_file)
+    # проходять через __setitem__ та __delitem__, тому саме тут оновлюються індекси
+    def __setitem__(self, key, record):
+        if self.compact_storage and not isinstance(record, CompactRecord):
+            record = CompactRecord.from_record(record)
+            key = record.name.value
+        if key in self.data:
+            self._unindex(key)
+        self.data[key] = record
+        record.book = self
+        self.name_index.add(key, (record.name.value,))
+        self._index_phones(key, record)
+        self.birthdays.add(key, record.birthday.month_day)
+        self.sorted_names.add(key, key.casefold())
+        self._invalidate_search((record.name.value,), self.phone_index.texts(key))
+        if self.fuzzy_names is not None:
+            self.fuzzy_names.add(key, record.name.value)
+
+    def __delitem__(self, key):
+        self._unindex(key)
+        self.data.pop(key).book = None
+
+    def _unindex(self, key):
+        self._invalidate_search(self.name_index.texts(key), self.phone_index.texts(key))
+        self.name_index.remove(key)
+        self.phone_index.remove(key)
+        self.phone_owners.remove(key)
+        self.birthdays.remove(key)
+        self.sorted_names.remove(key)
+        if self.fuzzy_names is not None:
+            self.fuzzy_names.remove(key)
+
+    def _index_phones(self, key, record):
+        phones = [phone.value for phone in record.phones]
+        self.phone_index.add(key, phones)
+        self.phone_owners.add(key, phones)
+
+    def phones_changed(self, record):
+        """Update indexes after the phones of the record were changed."""
+        key = record.name.value
+        if self.data.get(key) is record:
+            old_phones = self.phone_index.texts(key)
+            self._index_phones(key, record)
+            self._invalidate_search((), old_phones + self.phone_index.texts(key))
+
+    def _invalidate_search(self, names, phones):
+        # З кешу видаляються лише ті результати, на які впливає змінений запис:
+        # запити, що є підрядком його старого чи нового імені або номера
+        if not len(self.search_cache):
+            return
+        self.search_cache.invalidate(
+            lambda query: any(query[1] in value
+                              for value in (names if query[0] == "name" else phones)))
+
+    def sort_indexes(self):
+        """Finish the deferred sorting of the sorted indexes. After that reads
+        don't change the indexes and can run in several threads at once."""
+        self.birthdays.sort()
+        self.sorted_names.sort()
+
+    def owners(self, phone) -> list[Record]:
+        """Take as input phone number. Return all records with this number."""
+        return [self.data[name] for name in sorted(self.phone_owners.get(phone))]
+
+    def upcoming_birthdays(self, days) -> list[tuple[date, Record]]:
+        """Take as input number of days. Return list of (birthday date, record)
+        for all birthdays from today to today + days, ordered by date."""
+        today = date.today()
+        result = []
+        # Обхід починається з сьогоднішньої дати у календарному індексі та
+        # продовжується з початку року. Записи йдуть за зростанням дати,
+        # тому обхід зупиняється на першому, що не потрапляє у проміжок
+        for month_day, name in self.birthdays.iter_from((today.month, today.day), wrap=True):
+            birthday = next_birthday(*month_day, today)
+            if (birthday - today).days > days:
+                break
+            result.append((birthday, self.data[name]))
+        return result
+
     def add_record(self, record):
         self[record.name.value] = record
 
+    def import_records(self, records):
+        """Add many records at once. Existing records with the same names are replaced."""
+        for record in records:
+            self[record.name.value] = record
+
     def delete_record(self, name: Name):
         del self[name.value]
 
     def change_record(self, name, new_record):
+        # Якщо у нового запису інше ім'я, старий запис треба прибрати,
+        # інакше у книзі залишаться обидва
+        old_name = getattr(name, "value", name)
+        if old_name != new_record.name.value and old_name in self.data:
+            del self[old_name]
         self[new_record.name.value] = new_record
 
     def search(self, field: str, text: str) -> list[Record]:
-        result = []
-        if field.lower() == "name":
-            for record in self.data.values():
-                if text in record.name.value:
-                    result.append(record)
-        elif field.lower() == "phone":
-            for record in self.data.values():
-                for phone in record.phones:
-                    if text in phone.value:
-                        result.append(record)
-                        break
-        return result
+        field = field.lower()
+        if field == "name":
+            index = self.name_index
+        elif field == "phone":
+            index = self.phone_index
+        else:
+            return []
+        names = self.search_cache.get((field, text))
+        if names is None:
+            names = index.search(text)
+            if names is None:
+                # Запит коротший за n-граму - індекс не допоможе, тому
+                # записи перебираються так само, як і раніше
+                names = [name for name, record in self.data.items()
+                         if any(text in value for value in index.texts(name))]
+            names = tuple(sorted(names))
+            self.search_cache.put((field, text), names)
+        return [self.data[name] for name in names]
+
+    def fuzzy_search(self, text, limit=5) -> list[tuple[float, Record]]:
+        """Take as input text and number of results. Return up to limit
+        (similarity, record) pairs for names similar to the text, the most similar first."""
+        if self.fuzzy_names is None:
+            # Індекс стає доступним лише повністю побудованим, тому одночасний
+            # пошук з іншого потоку не побачить його наполовину заповненим
+            fuzzy_names = FuzzyIndex()
+            for name, record in self.data.items():
+                fuzzy_names.add(name, record.name.value)
+            self.fuzzy_names = fuzzy_names
+        return [(similarity, self.data[name])
+                for similarity, name in self.fuzzy_names.search(text, limit)]
     
+    @staticmethod
+    def record_from_row(row):
+        """Take as input csv row (dict). Return Record"""
+        username = Name(row["Name"])
+        # Формат csv не пітримує масивів. Тому для запису номерів телефону 
+        # довелося користатися таким не дуже красивим способом: записувати 
+        # телефони у як рядки
+        phones_str = re.sub(r"\[|\]|\ ", "",
+                            row["Phone numbers"]).split(",")
+        phones = [Phone(phone) for phone in phones_str if phone]
+        birthday = Birthday(row["Birthday"])
+        return Record(username, phones, birthday)
+
+    @staticmethod
+    def record_to_row(record):
+        return {"Name": record.name,
+                "Phone numbers": record.phones,
+                "Birthday": record.birthday}
+
+    @staticmethod
+    def journal_name(filename):
+        return f"{filename}.journal"
+
     @classmethod
-    def open_file(cls, filename):
+    def open_file(cls, filename, compact_storage=False):
         """Take as input filename. Return AddressBook"""
         try:
             with open(filename, encoding="utf-8") as file:
                 reader = csv.DictReader(file)
-                data = cls()
+                data = cls(compact_storage=compact_storage)
                 for row in reader:
-                    username = Name(row["Name"])
-                    # Формат csv не пітримує масивів. Тому для запису номерів телефону 
-                    # довелося користатися таким не дуже красивим способом: записувати 
-                    # телефони у як рядки
-                    phones_str = re.sub(r"\[|\]|\ ", "",
-                                        row["Phone numbers"]).split(",")
-                    phones = [Phone(phone) for phone in phones_str]
-                    birthday = Birthday(row["Birthday"])
                     # Тут з усіх даних створюється Record та записується до data, 
                     # що є екземпляром AddressBook
-                    record = Record(username, phones, birthday)
+                    record = cls.record_from_row(row)
                     data[record.name.value] = record
         except FileNotFoundError:
-            data = cls()
+            data = cls(compact_storage=compact_storage)
+        data.replay_journal(cls.journal_name(filename))
         return data
 
-    def write_to_csv(self, filename: str):
-        fieldnames = ["Name", "Phone numbers", "Birthday"]
+    def replay_journal(self, journal_filename):
+        """Apply to the book all changes written to the journal after the last snapshot."""
+        self.journal_length = 0
+        try:
+            with open(journal_filename, encoding="utf-8", newline="") as file:
+                lines = file.readlines()
+        except FileNotFoundError:
+            return
+        # Якщо програма впала посеред запису, останній рядок журналу буде неповним.
+        # Такий рядок просто відкидається - всі попередні зміни залишаються цілими
+        if lines and not lines[-1].endswith("\n"):
+            lines.pop()
+        for row in csv.DictReader(lines):
+            if row["Operation"] == "delete":
+                if row["Name"] in self:
+                    del self[row["Name"]]
+            else:
+                record = self.record_from_row(row)
+                self[record.name.value] = record
+            self.journal_length += 1
+
+    def append_to_journal(self, filename, changes):
+        """Take as input filename and dict {name: operation}.
+        Append one journal line per changed record instead of rewriting the whole file."""
+        journal_filename = self.journal_name(filename)
+        if os.path.exists(journal_filename):
+            self._drop_partial_line(journal_filename)
+        with open(journal_filename, "a", newline="", encoding="utf-8") as file:
+            writer = csv.DictWriter(file, fieldnames=self.journal_fieldnames)
+            # Заголовок перевіряється вже після обрізання: якщо програма впала посеред
+            # запису заголовка, файл обрізається до нуля і заголовок пишеться заново
+            if file.tell() == 0:
+                writer.writeheader()
+            for name, operation in changes.items():
+                # Незалежно від того, яка команда змінила запис, у журнал потрапляє
+                # його поточний стан. Якщо запису вже немає - це видалення
+                if name in self.data:
+                    row = self.record_to_row(self.data[name])
+                    row["Operation"] = operation
+                else:
+                    row = {"Operation": "delete", "Name": name}
+                writer.writerow(row)
+            file.flush()
+            os.fsync(file.fileno())
+        self.journal_length += len(changes)
+
+    @staticmethod
+    def _drop_partial_line(journal_filename):
+        # Неповний рядок після падіння програми обрізається, щоб нові записи
+        # не склеїлися з ним в один некоректний рядок
+        with open(journal_filename, "rb+") as file:
+            if file.seek(0, os.SEEK_END) == 0:
+                return
+            file.seek(-1, os.SEEK_END)
+            if file.read(1) == b"\n":
+                return
+            file.seek(0)
+            content = file.read()
+            file.truncate(content.rfind(b"\n") + 1)
+
+    def compact(self, filename):
+        """Fold the journal into the csv snapshot and remove the journal."""
+        self.write_to_csv(filename)
+        try:
+            os.remove(self.journal_name(filename))
+        except FileNotFoundError:
+            pass
+        self.journal_length = 0
 
-        with open(filename, "w", newline="", encoding="utf-8") as file:
-            writer = csv.DictWriter(file, fieldnames=fieldnames)
+    def write_to_csv(self, filename: str):
+        # Дані спочатку записуються у тимчасовий файл, який потім замінює старий.
+        # Так при падінні програми посеред запису старий файл залишиться неушкодженим
+        tmp_filename = f"{filename}.tmp"
+        with open(tmp_filename, "w", newline="", encoding="utf-8") as file:
+            writer = csv.DictWriter(file, fieldnames=self.fieldnames)
             writer.writeheader()
             for record in self.data.values():
-                writer.writerow(
-                    {"Name": record.name,
-                    "Phone numbers": record.phones,
-                    "Birthday": record.birthday})
-
+                writer.writerow(self.record_to_row(record))
+        os.replace(tmp_filename, filename)
 
+    def records(self):
+        """Yield all records of the book in alphabetical order."""
+        for _, name in self.sorted_names.iter_between():
+            yield self.data[name]
 
-    # Методи __iter__ та __next__ перетворюють елземпляри AddressBook на 
-    # ітератори, щоб користувачам показувати одночасно self.page_size записів
+    # Ітерація по AddressBook повертає сторінки по page_size записів,
+    # щоб користувачам показувати одночасно лише частину книги
     def __iter__(self):
+        return self.pages()
+
+    def pages(self, page_size=None, start=None, end=None):
+        """Return PageCursor over the records of the book in alphabetical order.
+        If start or end is given, only names from start to end are shown,
+        names that begin with end are included."""
+        low, high = name_bounds(start, end)
+
+        def records(after=None):
+            if after is not None:
+                after = (after.casefold(), after)
+            for _, name in self.sorted_names.iter_between(low, high, after):
+                yield self.data[name]
+
+        return PageCursor(records, self.sorted_names.count_between(low, high),
+                          page_size or self.page_size, key=lambda record: record.name.value)
+
+
+def name_bounds(start=None, end=None):
+    """Take as input first and last name of a range. Return (low, high) bounds
+    of casefolded names, high is exclusive. None means no bound."""
+    low = start.casefold() if start else None
+    # Усі імена, що починаються з end, менші за end з найбільшим символом Unicode в кінці
+    high = end.casefold() + chr(sys.maxunicode) if end else None
+    return low, high
+
+
+class PageCursor:
+    """Iterator over pages of records. Records are taken from the source one by one,
+    so showing a page never copies the whole book. If key is given, source takes
+    the key of the last seen record and pages are resumed after it, not skipped to."""
+
+    def __init__(self, source, total, page_size=10, key=None):
+        # source - функція, що повертає новий ітератор по записах. Новий ітератор
+        # потрібен, коли користувач повертається до однієї з попередніх сторінок
+        self.source = source
+        self.total = total
+        self.page_size = page_size
+        self.key = key
         self.current_page = 1
-        self.page_size = 10
-        self.start_index = (self.current_page - 1) * self.page_size
-        self.end_index = self.start_index + self.page_size
+        self._records = None
+        # {номер сторінки: ключ останнього запису перед нею} для вже показаних сторінок
+        self._page_starts = {1: None}
+
+    @property
+    def page_count(self):
+        return max(1, -(-self.total // self.page_size))
+
+    def __iter__(self):
         return self
-    
+
     def __next__(self):
-        if self.start_index >= len(self.data):
+        if self._records is None:
+            self._records = iter(self.source())
+        page_records = list(islice(self._records, self.page_size))
+        if not page_records:
             raise StopIteration
-        
-        page_records = list(self.data.values())[self.start_index:self.end_index]
-        self.start_index = self.end_index
-        self.end_index = self.start_index + self.page_size
         self.current_page += 1
-
+        if self.key is not None:
+            self._page_starts[self.current_page] = self.key(page_records[-1])
         return page_records
-    
\ No newline at end of file
+
+    def _restart(self, page):
+        if self.key is None:
+            self._records = iter(self.source())
+            self.current_page = 1
+            return
+        # Перегляд продовжується після останнього запису найближчої
+        # вже показаної сторінки, а не з початку книги
+        self.current_page = max(known for known in self._page_starts if known <= page)
+        self._records = iter(self.source(self._page_starts[self.current_page]))
+
+    def seek(self, page):
+        """Take as input page number. The next call of next() returns this page."""
+        if page < 1:
+            raise ValueError("Page number must be positive")
+        if self._records is None or page < self.current_page:
+            self._restart(page)
+        # Записи до потрібної сторінки пропускаються без створення списків
+        skip = (page - self.current_page) * self.page_size
+        next(islice(self._records, skip, skip), None)
+        self.current_page = page
+
+
+class AddressBookSession:
+    """Keep one AddressBook in memory for the whole program run.
+    Reads are served from memory, changed records are appended to the journal
+    every flush_interval seconds (on the next change or by the background timer
+    of start_flush_timer()), on exit or on explicit save(). When the journal
+    grows past compact_threshold lines it is folded back into the main file.
+    If filename has extension .db, .sqlite or .sqlite3, the book is stored in SQLite
+    and every change is saved immediately. If filename is a directory, the book is
+    split into shards and save() rewrites only the shards with changed records."""
+
+    sqlite_extensions = (".db", ".sqlite", ".sqlite3")
+
+    def __init__(self, filename, flush_interval=30, compact_threshold=1000,
+                 compact_storage=False):
+        self.filename = filename
+        self.compact_storage = compact_storage
+        self.flush_interval = flush_interval
+        self.compact_threshold = compact_threshold
+        # Словник {ім'я: операція} для записів, змінених після останнього збереження
+        self.dirty = {}
+        # Якщо watch_file вимкнено, файл перевіряється на зміни лише у refresh(),
+        # а не при кожному зверненні до book
+        self.watch_file = True
+        self._book = None
+        self._mtime = None
+        self._last_flush = time.monotonic()
+        # Блокування утримується під час виконання команди та під час збереження,
+        # щоб таймер збереження не записував книгу посеред її зміни
+        self.lock = threading.RLock()
+        self._flush_thread = None
+        # Загальний час, витрачений на завантаження та збереження книги.
+        # За цими лічильниками метрики команд розділяють час на фази
+        self.load_seconds = 0.0
+        self.save_seconds = 0.0
+
+    def _file_mtime(self):
+        # Зміни можуть з'явитися як у основному файлі, так і у журналі,
+        # а для книги з шардами - у будь-якому з шардів
+        if self.uses_shards:
+            import sharding
+            filenames = sharding.shard_files(self.filename)
+        else:
+            filenames = (self.filename, AddressBook.journal_name(self.filename))
+        result = []
+        for filename in filenames:
+            try:
+                result.append(os.stat(filename).st_mtime_ns)
+            except FileNotFoundError:
+                result.append(None)
+        return tuple(result)
+
+    @property
+    def uses_sqlite(self):
+        return self.filename.endswith(self.sqlite_extensions)
+
+    @property
+    def loaded(self):
+        """Return True if the book was already read from the file."""
+        return self._book is not None
+
+    @property
+    def uses_shards(self):
+        return os.path.isdir(self.filename)
+
+    @property
+    def book(self):
+        # База даних SQLite сама бачить зміни інших процесів і зберігає кожну зміну,
+        # тому її не потрібно ні перечитувати, ні записувати
+        if self.uses_sqlite:
+            if self._book is None:
+                # Імпорт тут, а не на початку модуля, бо sqlite_storage сам імпортує classes
+                from sqlite_storage import SQLiteAddressBook
+                self._book = SQLiteAddressBook(self.filename)
+            return self._book
+        if self._book is None or self.watch_file:
+            self.refresh()
+        return self._book
+
+    def refresh(self):
+        """Read the book again if the file was changed by someone else."""
+        if self.uses_sqlite:
+            return
+        # Файл перечитується лише тоді, коли його змінив хтось інший,
+        # тобто коли час модифікації відрізняється від запам'ятованого
+        mtime = self._file_mtime()
+        if self._book is None or mtime != self._mtime:
+            self._load(mtime)
+
+    def _load(self, mtime):
+        start = time.perf_counter()
+        if self.uses_shards:
+            # sharding імпортується лише для книги з шардами, бо тягне за собою пул процесів
+            import sharding
+            book = sharding.load(self.filename, self.compact_storage)
+        else:
+            book = AddressBook.open_file(self.filename, self.compact_storage)
+        # Ще не збережені зміни накладаються поверх свіжих даних з файлу,
+        # щоб не втратити їх при перечитуванні
+        if self._book is not None:
+            for name in self.dirty:
+                if name in self._book:
+                    book[name] = self._book[name]
+                elif name in book:
+                    del book[name]
+        self._book = book
+        self._mtime = mtime
+        self.load_seconds += time.perf_counter() - start
+
+    def mark_dirty(self, name, operation="change"):
+        """Remember that the record with this name was added, changed or deleted."""
+        if self.uses_sqlite:
+            return
+        self.dirty[name] = operation
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.save()
+
+    def start_flush_timer(self):
+        """Save changes every flush_interval seconds in a background thread,
+        also when no command is entered for a long time."""
+        if self._flush_thread is not None or self.flush_interval == float("inf"):
+            return
+        self._flush_thread = threading.Thread(target=self._flush_periodically, daemon=True)
+        self._flush_thread.start()
+
+    def _flush_periodically(self):
+        # Потік чекає до моменту, коли з останнього збереження мине flush_interval.
+        # Якщо за цей час зміни вже зберегла команда, очікування починається знову
+        while True:
+            time.sleep(max(0, self._last_flush + self.flush_interval - time.monotonic()))
+            with self.lock:
+                if time.monotonic() - self._last_flush >= self.flush_interval:
+                    self.save()
+
+    def mark_many_dirty(self, changes):
+        """Take as input dict {name: operation}. Remember all the changes without
+        intermediate saves, so they are written with one save()."""
+        if not self.uses_sqlite:
+            self.dirty.update(changes)
+
+    def save(self):
+        """Append all changed records to the journal and compact it if needed."""
+        with self.lock:
+            self._save()
+
+    def _save(self):
+        if self.dirty and self._book is not None:
+            start = time.perf_counter()
+            if self.uses_shards:
+                import sharding
+                sharding.save(self._book, self.filename, self.dirty)
+            else:
+                self._book.append_to_journal(self.filename, self.dirty)
+                if self._book.journal_length >= self.compact_threshold:
+                    self._book.compact(self.filename)
+            self._mtime = self._file_mtime()
+            self.save_seconds += time.perf_counter() - start
+        self.dirty.clear()
+        self._last_flush = time.monotonic()
@@ -0,0 +1,113 @@
+"""Client for the address book server and a load test for it.
+
+Usage:
+    python client.py [--host 127.0.0.1] [--port 8765] [--unix PATH] [command ...]
+    python client.py --load-test [--connections 100] [--requests 100] [--write-ratio 0.1]
+
+Without commands the client reads commands from stdin line by line and prints the
+answers. The load test opens many connections at once, each sends its requests one
+after another, and reports requests per second and latency percentiles.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+from metrics import percentile
+from protocol import DEFAULT_HOST, DEFAULT_PORT
+
+
+class Client:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_path=None):
+        if unix_path:
+            reader, writer = await asyncio.open_unix_connection(unix_path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def send(self, command):
+        """Send one command and return the answer of the server as a string."""
+        self.writer.write(command.encode("utf-8") + b"\n")
+        await self.writer.drain()
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError("server closed the connection")
+        answer = json.loads(line)
+        return answer.get("result", answer.get("error"))
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+async def run_commands(address, commands):
+    client = await Client.connect(*address)
+    try:
+        for command in commands:
+            command = command.strip()
+            if command:
+                print(await client.send(command))
+    finally:
+        await client.close()
+
+
+async def load_test(address, connections, requests, write_ratio, seed=0):
+    """Open connections at once, send requests from each one and print the throughput."""
+    generator = random.Random(seed)
+    latencies = []
+
+    async def worker(number):
+        client = await Client.connect(*address)
+        try:
+            for i in range(requests):
+                # Кожне з'єднання працює зі своїми контактами, тому записи не конфліктують
+                name = f"Load{number}x{i % 10}"
+                if generator.random() < write_ratio:
+                    command = f"add {name} {380000000000 + number * 1000 + i}"
+                else:
+                    command = generator.choice((f"phone {name}", "search name Load1",
+                                                f"owner {380000000000 + number * 1000}"))
+                start = time.perf_counter()
+                await client.send(command)
+                latencies.append(time.perf_counter() - start)
+        finally:
+            await client.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(number) for number in range(connections)))
+    seconds = time.perf_counter() - start
+    latencies.sort()
+    print(f"{len(latencies)} requests over {connections} connections in {seconds:.2f} s: "
+          f"{len(latencies) / seconds:.0f} requests/s")
+    print("latency ms: " + ", ".join(f"p{percent} {percentile(latencies, percent) * 1000:.2f}"
+                                     for percent in (50, 95, 99)))
+
+
+def cli():
+    parser = argparse.ArgumentParser(description="Send commands to the address book server.")
+    parser.add_argument("commands", nargs="*", help="commands to send, stdin if not given")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", metavar="PATH", help="connect to a Unix socket")
+    parser.add_argument("--load-test", action="store_true", help="run the load test")
+    parser.add_argument("--connections", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=100, help="requests per connection")
+    parser.add_argument("--write-ratio", type=float, default=0.1,
+                        help="share of requests that change the book")
+    args = parser.parse_args()
+    address = (args.host, args.port, args.unix)
+    if args.load_test:
+        asyncio.run(load_test(address, args.connections, args.requests, args.write_ratio))
+    else:
+        asyncio.run(run_commands(address, args.commands or sys.stdin))
+
+
+if __name__ == "__main__":
+    cli()
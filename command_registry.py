@@ -0,0 +1,135 @@
+from bisect import insort
+from collections import UserDict
+import importlib
+
+
+# Максимальна відстань редагування для підказок "можливо, Ви мали на увазі"
+SUGGESTION_DISTANCE = 2
+
+
+class TrieNode:
+    __slots__ = ("children", "command", "names")
+
+    def __init__(self):
+        self.children = {}
+        self.command = None
+        # Відсортований список усіх команд, що починаються з префікса цього вузла.
+        # Автодоповнення просто повертає цей список
+        self.names = []
+
+
+def _deletes(word, distance):
+    """Return all strings that can be made from word by deleting up to distance characters."""
+    result = {word}
+    current = {word}
+    for _ in range(distance):
+        current = {variant[:i] + variant[i + 1:]
+                   for variant in current for i in range(len(variant))}
+        result |= current
+    return result
+
+
+class LazyCommand:
+    """Command function that lives in another module. Take as input command name and
+    target in format "module:function". The module is imported on the first call."""
+
+    def __init__(self, name, target):
+        self.name = name
+        self.module, self.function = target.split(":")
+        self._func = None
+
+    def __call__(self, *args):
+        if self._func is None:
+            self._func = getattr(importlib.import_module(self.module), self.function)
+            self._func.command_name = self.name
+        return self._func(*args)
+
+
+class CommandRegistry(UserDict):
+    """Dictionary {command name: function} that also keeps the command names
+    in a prefix tree. The tree is built once when commands are registered and is used
+    to split user input into command and arguments, for autocompletion and
+    for "did you mean" suggestions."""
+
+    def __init__(self, *args, **kwargs):
+        self._root = TrieNode()
+        # Для підказок заздалегідь рахуються всі варіанти назв команд з видаленими
+        # 1-2 символами. Якщо у введеного слова та команди є спільний варіант,
+        # відстань редагування між ними невелика
+        self._deletes = {}
+        super().__init__(*args, **kwargs)
+
+    def __setitem__(self, name, func):
+        name = name.lower()
+        if name not in self.data:
+            self._insert(name)
+        self.data[name] = func
+
+    def __delitem__(self, name):
+        del self.data[name]
+        # Команди видаляються рідко, тому дерево простіше побудувати заново
+        self._root = TrieNode()
+        self._deletes = {}
+        for command in self.data:
+            self._insert(command)
+
+    def _insert(self, name):
+        node = self._root
+        insort(node.names, name)
+        for char in name:
+            node = node.children.setdefault(char, TrieNode())
+            insort(node.names, name)
+        node.command = name
+        for variant in _deletes(name, SUGGESTION_DISTANCE):
+            self._deletes.setdefault(variant, set()).add(name)
+
+    def _walk(self, node, text):
+        for char in text:
+            node = node.children.get(char)
+            if node is None:
+                return None
+        return node
+
+    def resolve(self, user_input):
+        """Take as input user input. Return (command, arguments) for the longest command
+        the input starts with. If there is no such command, the part of the input that
+        looks like a command name is returned instead of the command.
+        Raise IndexError if the input is empty."""
+        words = user_input.split()
+        if not words:
+            raise IndexError("empty input")
+        # Дерево проходиться за один прохід по словах вводу. Запам'ятовується
+        # остання повна команда на шляху - це і є найдовша команда
+        node = matched_node = self._root
+        command, command_words, matched_words = None, 0, 0
+        for i, word in enumerate(words):
+            if i:
+                node = node.children.get(" ")
+                if node is None:
+                    break
+            node = self._walk(node, word.lower())
+            if node is None:
+                break
+            matched_node, matched_words = node, i + 1
+            if node.command is not None:
+                command, command_words = node.command, i + 1
+        if command is None:
+            # Якщо введені слова є початком команди з кількох слів (наприклад, del),
+            # назвою команди вважається і наступне слово
+            command_words = max(matched_words, 1)
+            if matched_words and " " in matched_node.children:
+                command_words += 1
+            return " ".join(words[:command_words]).lower(), words[command_words:]
+        return command, words[command_words:]
+
+    def complete(self, prefix):
+        """Return sorted list of commands starting with the prefix."""
+        node = self._walk(self._root, prefix.lower())
+        return node.names if node is not None else []
+
+    def candidates(self, word):
+        """Return set of commands that differ from the word in a few characters."""
+        result = set()
+        for variant in _deletes(word.lower(), SUGGESTION_DISTANCE):
+            result |= self._deletes.get(variant, set())
+        return result
@@ -0,0 +1,184 @@
+"""Detection and merge of duplicate contacts.
+
+Comparing every pair of contacts is quadratic, so contacts are first split into blocks
+of candidates: contacts with the same normalized phone number and contacts with the same
+name key. Only records inside one block are compared, and pairs of duplicates are joined
+in a union-find structure, so the whole book is processed in near-linear time. Each group
+of duplicates is then merged into one record with the phones of all of them.
+"""
+from difflib import SequenceMatcher
+from itertools import combinations
+import re
+
+import classes
+import handlers
+
+
+# Скільки груп дублікатів показується у звіті
+REPORT_GROUPS_LIMIT = 20
+# Мінімальна схожість прізвищ(та інших частин імені, крім власне імені), щоб записи
+# зі спільним номером вважалися дублікатами. Самі імена мають збігатися повністю
+SURNAME_SIMILARITY = 0.8
+# Блоки, більші за цей розмір, не перевіряються
+MAX_BLOCK_SIZE = 50
+NOT_ALPHANUMERIC = re.compile(r"\W|_")
+NAME_SEPARATORS = re.compile(r"[\W_]+")
+# Повтори прибираються лише для літер, цифри у імені залишаються як є
+REPEATED_LETTERS = re.compile(r"([^\W\d_])\1+")
+
+
+def name_key(name):
+    """Return key that is the same for different spellings of one name:
+    only letters and digits without case, 'y' as 'i', no repeated letters."""
+    key = NOT_ALPHANUMERIC.sub("", name.casefold()).replace("y", "i")
+    return REPEATED_LETTERS.sub(r"\1", key)
+
+
+def name_tokens(name):
+    """Return list of keys of the separate words of the name."""
+    return [key for key in map(name_key, NAME_SEPARATORS.split(name)) if key]
+
+
+class UnionFind:
+    def __init__(self):
+        self.parents = {}
+
+    def find(self, item):
+        root = self.parents.setdefault(item, item)
+        while self.parents[root] != root:
+            root = self.parents[root]
+        # Стиснення шляху: усі елементи на шляху одразу посилаються на корінь
+        while item != root:
+            self.parents[item], item = root, self.parents[item]
+        return root
+
+    def union(self, first, second):
+        first, second = self.find(first), self.find(second)
+        if first != second:
+            self.parents[max(first, second)] = min(first, second)
+
+    def groups(self):
+        """Return list of groups with more than one item."""
+        result = {}
+        for item in self.parents:
+            result.setdefault(self.find(item), []).append(item)
+        return [sorted(group) for group in result.values() if len(group) > 1]
+
+
+class DuplicateGroup:
+    def __init__(self, records):
+        # Основним стає запис з найбільшою кількістю телефонів, далі - з днем
+        # народження, при рівності - перший за алфавітом
+        self.records = sorted(records, key=lambda record: (-len(record.phones),
+                                                           not record.birthday.value,
+                                                           record.name.value))
+        self.main = self.records[0]
+        self.duplicates = self.records[1:]
+
+    def merged(self):
+        """Return new Record with the name of the main record, phones of all records
+        without repeats and the first known birthday."""
+        phones, known = [], set()
+        birthday = self.main.birthday
+        for record in self.records:
+            for phone in record.phones:
+                if classes.Phone.normalize(phone.value) not in known:
+                    known.add(classes.Phone.normalize(phone.value))
+                    phones.append(phone)
+            if not birthday.value:
+                birthday = record.birthday
+        return classes.Record(self.main.name, phones, birthday)
+
+    def conflicts(self):
+        """Return set of different birthdays in the group."""
+        return {record.birthday.value for record in self.records if record.birthday.value}
+
+    def __str__(self):
+        names = ", ".join(record.name.value for record in self.duplicates)
+        line = f"{names} -> {self.merged()}"
+        if len(self.conflicts()) > 1:
+            line += f" (different birthdays: {', '.join(sorted(self.conflicts()))})"
+        return line
+
+
+def is_duplicate(first, second):
+    """Return True if two records from one block are probably the same person:
+    their birthdays don't contradict, their name keys are equal or their first words
+    are the same and the other words are similar. A word missing in one of the names
+    (for example, no surname) doesn't prevent a match."""
+    if first.birthday.value and second.birthday.value \
+            and first.birthday.value != second.birthday.value:
+        return False
+    if name_key(first.name.value) == name_key(second.name.value):
+        return True
+    # Імена порівнюються по словах. Схожість цілих імен об'єднала б різних людей
+    # зі спільним номером: "Olena Koval" та "Oleh Koval" схожі на 84%.
+    # Тому власне імена мають збігатися точно, а схожими можуть бути лише прізвища
+    first_tokens, second_tokens = name_tokens(first.name.value), name_tokens(second.name.value)
+    if not first_tokens or not second_tokens or first_tokens[0] != second_tokens[0]:
+        return False
+    return all(SequenceMatcher(None, first_word, second_word).ratio() >= SURNAME_SIMILARITY
+               for first_word, second_word in zip(first_tokens[1:], second_tokens[1:]))
+
+
+def find_duplicates(book):
+    """Take as input AddressBook or SQLiteAddressBook. Return list of DuplicateGroup."""
+    # Записи розподіляються по блоках за кожним нормалізованим номером та за
+    # ключем імені. Порівнюються лише записи всередині одного блоку
+    blocks, records = {}, {}
+    for record in book.records():
+        name = record.name.value
+        records[name] = record
+        for phone in {classes.Phone.normalize(phone.value) for phone in record.phones}:
+            blocks.setdefault(("phone", phone), []).append(name)
+        blocks.setdefault(("name", name_key(name)), []).append(name)
+    union_find = UnionFind()
+    for block in blocks.values():
+        # Занадто великий блок - це, наприклад, спільний номер організації,
+        # а не дублікати. Порівняння всіх пар у ньому зробило б пошук квадратичним
+        if len(block) < 2 or len(block) > MAX_BLOCK_SIZE:
+            continue
+        for first, second in combinations(block, 2):
+            if is_duplicate(records[first], records[second]):
+                union_find.union(first, second)
+    return [DuplicateGroup([records[name] for name in group])
+            for group in union_find.groups()]
+
+
+def merge_duplicates(book, groups):
+    """Merge every group into one record. Return dict {name: operation} of changes."""
+    changes = {}
+    for group in groups:
+        for record in group.duplicates:
+            book.delete_record(record.name)
+            changes[record.name.value] = "delete"
+        book.change_record(group.main.name, group.merged())
+        changes[group.main.name.value] = "change"
+    return changes
+
+
+def report(groups, applied):
+    if not groups:
+        return "No duplicates found."
+    action = "Merged" if applied else "Found"
+    lines = [f"{action} {len(groups)} groups of duplicates "
+             f"({sum(len(group.duplicates) for group in groups)} duplicate users):"]
+    lines += [str(group) for group in groups[:REPORT_GROUPS_LIMIT]]
+    if len(groups) > REPORT_GROUPS_LIMIT:
+        lines.append(f"... and {len(groups) - REPORT_GROUPS_LIMIT} more.")
+    if not applied:
+        lines.append("Enter 'dedupe apply' to merge them.")
+    return "\n".join(lines)
+
+
+# Обробник реєструється у handlers як лінивий, там же задається опис команди для help
+@handlers.input_error
+def dedupe_handler(*args):
+    if args and args[0].lower() != "apply":
+        raise ValueError
+    session = handlers.session
+    groups = find_duplicates(session.book)
+    if args:
+        session.mark_many_dirty(merge_duplicates(session.book, groups))
+        session.save()
+    return report(groups, applied=bool(args))
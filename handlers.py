@@ -1,11 +1,57 @@
+import atexit
+from datetime import date
 import os
 import platform
 import sys
+import time
 
 import classes
+from command_registry import CommandRegistry, LazyCommand
+import metrics
 
 
-commands = {}
+commands = CommandRegistry()
+
+# Сесія тримає адресну книгу у пам'яті весь час роботи програми.
+# Змінені записи дописуються у журнал раз на FLUSH_INTERVAL секунд,
+# при виході з програми або за командою save. Коли у журналі набирається
+# COMPACT_THRESHOLD рядків, він переноситься у основний файл data.csv.
+# COMPACT_STORAGE вмикає компактне зберігання записів у пам'яті для дуже великих книг.
+# Якщо DATA_FILE має розширення .db, книга зберігається у базі даних SQLite
+# Якщо DATA_FILE - директорія, книга зберігається у шардах(див. sharding.py)
+DATA_FILE = "data.csv"
+FLUSH_INTERVAL = 30
+COMPACT_THRESHOLD = 1000
+COMPACT_STORAGE = False
+# Кількість результатів нечіткого пошуку
+FUZZY_SEARCH_LIMIT = 5
+session = classes.AddressBookSession(DATA_FILE, FLUSH_INTERVAL, COMPACT_THRESHOLD,
+                                     COMPACT_STORAGE)
+atexit.register(session.save)
+
+# Метрики всіх команд: кількість викликів, помилок та час виконання.
+# Якщо STATS_FILE задано, метрики записуються у цей файл при виході з програми
+stats = metrics.CommandMetrics()
+STATS_FILE = None
+
+
+def dump_stats():
+    if STATS_FILE:
+        stats.dump(STATS_FILE)
+
+
+atexit.register(dump_stats)
+
+
+def search_cache_counts():
+    # Книга ще не завантажена або зберігається в SQLite, де кешу пошуку немає
+    if not session.loaded:
+        return None
+    cache = getattr(session.book, "search_cache", None)
+    return cache.counts() if cache is not None else None
+
+
+stats.counters["search_cache"] = search_cache_counts
 
 # Декоратор set_commands створений для наповнення словника commands
 # Ключами є команда, котра передається у якості аргумента name та, за потреби,
@@ -14,21 +60,59 @@ commands = {}
 
 def set_commands(name, *additional):
     def inner(func):
-        commands[name] = func
+        # Ім'я команди запам'ятовується у функції, щоб input_error
+        # міг записати помилку саме для цієї команди
+        func.command_name = name
+        measured_func = measured(name, func)
+        commands[name] = measured_func
         for command in additional:
-            commands[command] = func
+            commands[command] = measured_func
     return inner
 
 
+# Декоратор measured вимірює час виконання кожної команди. Сесія рахує загальний
+# час завантаження та збереження книги, тому різниця цих лічильників до та після
+# команди показує, скільки часу команда витратила на кожну з фаз
+def measured(name, func):
+    def inner(*args):
+        load_seconds, save_seconds = session.load_seconds, session.save_seconds
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        except Exception as error:
+            stats.record_error(name, error)
+            raise
+        finally:
+            stats.observe(name, time.perf_counter() - start,
+                          session.load_seconds - load_seconds,
+                          session.save_seconds - save_seconds)
+    inner.__doc__ = func.__doc__
+    return inner
+
+
+# Команди, код яких знаходиться в окремих модулях, реєструються за назвою модуля
+# та функції. Модуль імпортується лише при першому виклику команди, тому
+# важкі залежності таких команд не сповільнюють запуск програми.
+# Опис команди для help передається тут, а не береться з рядка документації
+# функції, бо для цього довелося б імпортувати модуль
+def set_lazy_command(name, target, doc):
+    lazy_func = LazyCommand(name, target)
+    lazy_func.__doc__ = doc
+    commands[name] = measured(name, lazy_func)
+
+
 def input_error(func):
     def inner(*args):
         try:
             return func(*args)
-        except (IndexError, ValueError):
+        except (IndexError, ValueError) as error:
+            stats.record_error(getattr(inner, "command_name", func.__name__), error)
             return "Enter all require arguments please.\nTo see more info type 'help'."
-        except classes.WrongPhone:
+        except classes.WrongPhone as error:
+            stats.record_error(getattr(inner, "command_name", func.__name__), error)
             return "You tried to enter an invalid phone number. Please check the value and try again"
-        except classes.WrongDate:
+        except classes.WrongDate as error:
+            stats.record_error(getattr(inner, "command_name", func.__name__), error)
             return "Invalid date. Please enter birthday in format 'DD.MM.YYYY'."
     # Рядок нижче потрібний для того, щоб пов'язати функції та їх рядки документації.
     # Це потрібно для функції help.
@@ -58,12 +142,17 @@ def add(*args):
 
     # У змінній data зберігається екземпляр класу AddressBook із записаними раніше контактами
     # Змінна name_exists показує, чи існує контакт з таким ім'ям у data
-    data = classes.AddressBook.open_file("data.csv")
+    data = session.book
     name_exists = bool(data.get(name.value))
 
     # Тут відбувається перевірка, чи ім'я вже є у списку контактів
     # Якщо контакт відсутній, створюється новий Record.
     # Якщо присутній - до існуючого екземпляру Record додається номер телефону
+    # Номер вже може належати іншим контактам. Це не помилка, але користувачу
+    # варто про це знати
+    other_owners = [record.name.value for record in data.owners(phone_number.value)
+                    if record.name.value != name.value]
+
     if name_exists and phone_number:
         # Методи класу Record повертають повідомлення для користувача
         # Дані повідомлення записуються у змінну та повертаються з функції
@@ -76,7 +165,9 @@ def add(*args):
         data.add_record(record)
         msg = f"User {name} added successfully."
 
-    data.write_to_csv("data.csv")
+    session.mark_dirty(name.value, "change" if name_exists else "add")
+    if other_owners:
+        msg += f"\nNote: this number also belongs to {', '.join(other_owners)}."
     return msg
 
 
@@ -85,7 +176,7 @@ def add(*args):
 def days_to_birthday_handler(*args):
     """Take as input username and show the number of days until his birthday"""
     name = classes.Name(args[0])
-    data = classes.AddressBook.open_file("data.csv")
+    data = session.book
     name_exists = bool(data.get(name.value))
 
     if not name_exists:
@@ -94,6 +185,22 @@ def days_to_birthday_handler(*args):
     return data[name.value].days_to_birthday()
 
 
+@set_commands("birthdays")
+@input_error
+def upcoming_birthdays(*args):
+    """Take as input number of days and show users whose birthday is within that period."""
+    days = int(args[0])
+    if days < 0:
+        raise ValueError
+    upcoming = session.book.upcoming_birthdays(days)
+    if not upcoming:
+        return f"There are no birthdays in the next {days} days."
+    today = date.today()
+    return "\n".join(f"{birthday.strftime('%d %B')}: {record.name} "
+                     f"(in {(birthday - today).days} days)"
+                     for birthday, record in upcoming)
+
+
 @set_commands("change")
 @input_error
 def change(*args):
@@ -107,7 +214,7 @@ def change(*args):
     else:
         raise classes.WrongPhone
 
-    data = classes.AddressBook.open_file("data.csv")
+    data = session.book
     name_exists = bool(data.get(name.value))
 
     if not name_exists:
@@ -115,8 +222,8 @@ def change(*args):
             "If you want to add it, please type 'add user <name> <phone number>'."
     else:
         msg = data[name.value].change_phone(old_phone, new_phone)
+        session.mark_dirty(name.value)
 
-    data.write_to_csv("data.csv")
     return msg
 
 
@@ -141,7 +248,7 @@ def delete_user(*args):
     """Take as input username and delete that user"""
     name = classes.Name(args[0])
 
-    data = classes.AddressBook.open_file("data.csv")
+    data = session.book
     name_exists = bool(data.get(name.value))
 
     if not name_exists:
@@ -149,7 +256,7 @@ def delete_user(*args):
     else:
         data.delete_record(name)
 
-    data.write_to_csv("data.csv")
+    session.mark_dirty(name.value, "delete")
     return f"User {name} deleted successfully."
 
 
@@ -160,15 +267,15 @@ def delete_phone(*args):
     name = classes.Name(args[0])
     phone = classes.Phone(args[1])
 
-    data = classes.AddressBook.open_file("data.csv")
+    data = session.book
     name_exists = bool(data.get(name.value))
 
     if not name_exists:
         msg = f"Name {name} doesn`t exists."
     else:
         msg = data[name.value].delete_phone(phone)
+        session.mark_dirty(name.value)
 
-    data.write_to_csv("data.csv")
     return msg
 
 
@@ -194,13 +301,24 @@ def help_command(*args):
     return all_commands
 
 
+@set_commands("owner")
+@input_error
+def owner(*args):
+    """Take as input phone number and show users who own it."""
+    records = session.book.owners(args[0])
+    if not records:
+        return f"Phone number {args[0]} doesn`t belong to any user."
+    names = ", ".join(record.name.value for record in records)
+    return f"Phone number {args[0]} belongs to: {names}."
+
+
 @set_commands("phone")
 @input_error
 def phone(*args):
     """Take as input username and show user`s phone number."""
     name = classes.Name(args[0])
 
-    data = classes.AddressBook.open_file("data.csv")
+    data = session.book
     name_exists = bool(data.get(name.value))
 
     if not name_exists:
@@ -217,34 +335,102 @@ def phone(*args):
             return f"There are no phone numbers for user {name}"
 
 
+@set_commands("save")
+@input_error
+def save(*args):
+    """Save all changes to the file."""
+    session.save()
+    return "All changes saved."
+
+
 @set_commands("show all")
 @input_error
 def show_all(*args):
-    """Show all users."""
-    # Код функції show_all має саме такий вигляд тому, що AddressBook
-    # це ітератор
-    return classes.AddressBook.open_file("data.csv")
+    """Show all users. Optionally take as input the number of users on one page."""
+    # Функція повертає PageCursor - ітератор по сторінках книги.
+    # Сторінки читаються по одній лише тоді, коли користувач їх гортає
+    page_size = int(args[0]) if args else None
+    if page_size is not None and page_size < 1:
+        raise ValueError
+    return session.book.pages(page_size)
+
+
+@set_commands("show from")
+@input_error
+def show_from(*args):
+    """Take as input first name and optionally 'to' and last name. Show users whose names
+    are between them in alphabetical order, names starting with the last name included.
+    'show from ka to ka' shows all users whose names start with 'ka'."""
+    start = args[0]
+    end = None
+    if len(args) > 1:
+        if args[1].lower() != "to" or len(args) != 3:
+            raise ValueError
+        end = args[2]
+    return session.book.pages(None, start, end)
 
 
 @set_commands("search")
 @input_error
 def search_handler(*args):
     """Take as input searched field(name or phone)
-    and the text to be found. Returns all found users"""
+    and the text to be found. Returns all found users.
+    'search fuzzy <text>' finds users with names similar to the text."""
     # у даній функції користувачу потрібно обрати, у яких полях
     # відбуватиметься пошук(наразі це name або phone) та ввести значення для пошуку.
     #  Функція повертає рядок з переліком усіх контаків
     field = args[0]
     text = args[1]
+    if field.lower() == "fuzzy":
+        # Нечіткий пошук повертає лише FUZZY_SEARCH_LIMIT найсхожіших записів
+        result = session.book.fuzzy_search(" ".join(args[1:]), FUZZY_SEARCH_LIMIT)
+        if not result:
+            return "There are no users matching"
+        return "\n".join([f"{similarity:.0%} {rec}" for similarity, rec in result])
     if field.lower() not in ("name", "phone"):
         return f"Unknown field '{field}'.\nTo see more info enter 'help'"
-    ab = classes.AddressBook.open_file("data.csv")
-    result = ab.search(field, text)
+    result = session.book.search(field, text)
     if not result:
         return "There are no users matching"
     return "\n".join([str(rec) for rec in result])
 
 
+@set_commands("stats")
+@input_error
+def stats_handler(*args):
+    """Show call counts, errors and time of all commands. Optionally take as input
+    format(json or prometheus) or 'dump <file>' to write metrics to the file."""
+    if not args:
+        return stats.report()
+    if args[0] == "json":
+        return stats.to_json()
+    if args[0] == "prometheus":
+        return stats.to_prometheus()
+    if args[0] == "dump":
+        # Помилку запису файлу(немає директорії чи прав) не перехоплює input_error,
+        # тому вона обробляється тут, щоб не зупинити програму чи скрипт --batch
+        try:
+            stats.dump(args[1])
+        except OSError as error:
+            stats.record_error("stats", error)
+            return f"Could not save metrics to {args[1]}: {error.strerror or error}."
+        return f"Metrics saved to {args[1]}."
+    return f"Unknown format '{args[0]}'.\nTo see more info enter 'help'"
+
+
+set_lazy_command("import", "importer:import_handler",
+                 """Take as input path to csv or vCard(.vcf) file and add all users from it.
+    Existing users get new phone numbers and birthday.""")
+set_lazy_command("dedupe", "dedupe:dedupe_handler",
+                 """Find users that are probably the same person: with a common phone number or with
+    the same name written differently. 'dedupe apply' merges every group into one user.""")
+# Команда називається birthdays report, а не birthday report: інакше ввід
+# "birthday report" для контакту з ім'ям Report запускав би звіт
+set_lazy_command("birthdays report", "analytics:report_handler",
+                 """Show birthday distribution by month and weekday, number of birthdays in the next
+    7/30/90 days and age groups. 'birthdays report csv <file>' saves the report to the file.""")
+
+
 @set_commands("exit", "close", "good bye")
 @input_error
 def exit(*args):
@@ -0,0 +1,220 @@
+"""Bulk import of contacts from csv or vCard files.
+
+Rows are read from the file in batches, batches are validated in a process pool,
+then valid contacts are merged into the book: new users are added, existing users
+get new phone numbers and a birthday if they had none.
+"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import csv
+from itertools import islice
+import os
+import re
+import time
+
+import classes
+import handlers
+
+
+BATCH_SIZE = 1000
+# Скільки рядків у звіті показується для відхилених записів
+REPORT_REJECTED_LIMIT = 20
+
+
+class ImportResult:
+    def __init__(self):
+        self.rows = 0
+        self.added = 0
+        self.merged = 0
+        self.rejected = []
+        self.changes = {}
+        self.seconds = 0.0
+
+    def report(self):
+        speed = self.rows / self.seconds if self.seconds else 0
+        lines = [f"Imported {self.rows} rows in {self.seconds:.2f} s ({speed:.0f} rows/s): "
+                 f"{self.added} added, {self.merged} merged, {len(self.rejected)} rejected."]
+        for line_number, reason in self.rejected[:REPORT_REJECTED_LIMIT]:
+            lines.append(f"Row {line_number}: {reason}")
+        if len(self.rejected) > REPORT_REJECTED_LIMIT:
+            lines.append(f"... and {len(self.rejected) - REPORT_REJECTED_LIMIT} more.")
+        return "\n".join(lines)
+
+
+# Кожен рядок файлу перетворюється на кортеж (номер рядка, ім'я, список телефонів,
+# день народження). Такі кортежі легко передаються у інші процеси
+def read_csv(filename):
+    with open(filename, encoding="utf-8", newline="") as file:
+        reader = csv.DictReader(file)
+        for row in reader:
+            phones = row.get("Phone numbers") or row.get("Phones") or row.get("Phone") or ""
+            phones = [phone for phone in re.split(r"[,;]", re.sub(r"[\[\]]", "", phones))
+                      if phone.strip()]
+            yield (reader.line_num, (row.get("Name") or "").strip(), phones,
+                   (row.get("Birthday") or "").strip())
+
+
+def read_vcard(filename):
+    name, phones, birthday, start = "", [], "", 0
+    with open(filename, encoding="utf-8") as file:
+        for line_number, line in enumerate(_unfold(file), 1):
+            # Властивість vCard має вигляд NAME;PARAMS:VALUE
+            key, _, value = line.partition(":")
+            key = key.split(";")[0].upper()
+            value = value.strip()
+            if key == "BEGIN":
+                name, phones, birthday, start = "", [], "", line_number
+            elif key == "FN":
+                name = value
+            elif key == "N" and not name:
+                name = " ".join(part for part in reversed(value.split(";")[:2]) if part)
+            elif key == "TEL":
+                phones.append(value)
+            elif key == "BDAY":
+                birthday = _vcard_date(value)
+            elif key == "END":
+                yield start, name, phones, birthday
+
+
+def _unfold(lines):
+    # У vCard довгі рядки переносяться, а продовження починається з пробілу або табуляції
+    current = None
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current is not None:
+        yield current
+
+
+def _vcard_date(value):
+    # vCard записує дату як 1990-02-01 або 19900201, а книга - як 01.02.1990
+    match = re.fullmatch(r"(\d{4})-?(\d{2})-?(\d{2})", value)
+    if not match:
+        return value
+    year, month, day = match.groups()
+    return f"{day}.{month}.{year}"
+
+
+def read_rows(filename):
+    if filename.lower().endswith((".vcf", ".vcard")):
+        return read_vcard(filename)
+    return read_csv(filename)
+
+
+def validate_batch(rows):
+    """Take as input list of rows. Return (valid rows, rejected rows with the reason)."""
+    valid, rejected = [], []
+    for line_number, name, phones, birthday in rows:
+        # Пробіли, дефіси та дужки у номерах прибираються до перевірки
+        phones = [re.sub(r"[\s\-()]", "", phone) for phone in phones]
+        invalid_phones = [phone for phone in phones if not classes.Phone.is_valid_phone(phone)]
+        if not name:
+            rejected.append((line_number, "no name"))
+        elif invalid_phones:
+            rejected.append((line_number, f"invalid phone {', '.join(invalid_phones)}"))
+        elif birthday and not classes.Birthday.is_valid_date(birthday):
+            rejected.append((line_number, f"invalid birthday {birthday}"))
+        else:
+            valid.append((name, phones, birthday))
+    return valid, rejected
+
+
+def _batches(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def _validated(rows, workers, batch_size):
+    # Одночасно у пулі знаходиться не більше 2 * workers пакетів, тому файл
+    # читається потоково, а не завантажується у пам'ять повністю
+    if workers <= 1:
+        yield from map(validate_batch, _batches(rows, batch_size))
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for batch in _batches(rows, batch_size):
+            pending.append(executor.submit(validate_batch, batch))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def import_file(book, filename, workers=None, batch_size=BATCH_SIZE):
+    """Take as input AddressBook and csv or vCard filename. Add contacts from the file
+    to the book. Return ImportResult."""
+    result = ImportResult()
+    start = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    # Записи спершу збираються тут, а потім додаються до книги разом.
+    # Повторні рядки для одного імені об'єднуються у той самий запис
+    records = {}
+    for valid, rejected in _validated(read_rows(filename), workers, batch_size):
+        result.rejected.extend(rejected)
+        result.rows += len(valid) + len(rejected)
+        for name, phones, birthday in valid:
+            record = records.get(name)
+            if record is None:
+                existing = book.get(name)
+                if existing is None:
+                    record = classes.Record(classes.Name(name))
+                    result.changes[name] = "add"
+                    result.added += 1
+                else:
+                    record = classes.Record(existing.name, existing.phones, existing.birthday)
+                    result.changes[name] = "change"
+                    result.merged += 1
+                records[name] = record
+            else:
+                result.merged += 1
+            _merge(record, phones, birthday)
+    book.import_records(records.values())
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+def _merge(record, phones, birthday):
+    known = {classes.Phone.normalize(phone.value) for phone in record.phones}
+    new_phones = []
+    for phone in phones:
+        if classes.Phone.normalize(phone) not in known:
+            known.add(classes.Phone.normalize(phone))
+            new_phones.append(classes.Phone(phone))
+    if new_phones:
+        record.phones = record.phones + new_phones
+    if birthday and not record.birthday.value:
+        record.birthday = classes.Birthday(birthday)
+
+
+# Цей обробник реєструється у handlers як лінивий: модуль importer(а з ним і пул
+# процесів) завантажується лише при першому виклику команди import.
+# Опис команди для help задається там же, при реєстрації
+@handlers.input_error
+def import_handler(*args):
+    filename = " ".join(args)
+    if not filename:
+        raise IndexError
+    if not os.path.isfile(filename):
+        return f"File {filename} not found."
+    session = handlers.session
+    # UnicodeDecodeError є підкласом ValueError, тому без цієї обробки input_error
+    # відповів би, що не вистачає аргументів. Записи додаються до книги лише після
+    # читання всього файлу, тож при помилці книга не змінюється
+    try:
+        result = import_file(session.book, filename)
+    except UnicodeDecodeError as error:
+        handlers.stats.record_error("import", error)
+        return f"Could not import {filename}: the file is not in UTF-8 encoding."
+    except (csv.Error, OSError) as error:
+        handlers.stats.record_error("import", error)
+        return f"Could not import {filename}: {getattr(error, 'strerror', None) or error}."
+    # Усі зміни записуються у файл одним збереженням наприкінці імпорту
+    session.mark_many_dirty(result.changes)
+    session.save()
+    return result.report()
@@ -0,0 +1,318 @@
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter, OrderedDict, defaultdict
+from difflib import SequenceMatcher
+import heapq
+import threading
+
+
+class NGramIndex:
+    """Inverted index from n-grams (by default trigrams) to the keys of indexed texts.
+    Answers "which keys have a text containing the substring" without scanning all texts."""
+
+    def __init__(self, n=3):
+        self.n = n
+        self._postings = defaultdict(set)
+        # Для кожного ключа зберігаються проіндексовані тексти. Вони потрібні,
+        # щоб прибрати старі n-грами при зміні запису та перевірити кандидатів
+        self._texts = {}
+
+    def _grams(self, text):
+        return {text[i:i + self.n] for i in range(len(text) - self.n + 1)}
+
+    def add(self, key, texts):
+        """Index texts under key. Texts indexed for this key earlier are replaced."""
+        self.remove(key)
+        texts = tuple(texts)
+        if not texts:
+            return
+        self._texts[key] = texts
+        for text in texts:
+            for gram in self._grams(text):
+                self._postings[gram].add(key)
+
+    def remove(self, key):
+        texts = self._texts.pop(key, None)
+        if not texts:
+            return
+        for text in texts:
+            for gram in self._grams(text):
+                keys = self._postings.get(gram)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._postings[gram]
+
+    def texts(self, key):
+        return self._texts.get(key, ())
+
+    def search(self, text):
+        """Return set of keys with a text containing the given text.
+        Return None if the text is shorter than n and the index can't help."""
+        if len(text) < self.n:
+            return None
+        # Перетин починається з найменшого списку, тому вартість пошуку
+        # залежить від кількості кандидатів, а не від розміру книги
+        postings = sorted((self._postings.get(gram, set()) for gram in self._grams(text)),
+                          key=len)
+        candidates = postings[0].intersection(*postings[1:])
+        # Наявність усіх n-грам ще не означає наявність підрядка
+        # (наприклад "abcXbcd" містить "abc" та "bcd", але не "abcd"), тому кандидати перевіряються
+        return {key for key in candidates
+                if any(text in value for value in self._texts[key])}
+
+
+class ReverseIndex:
+    """Hash index from a normalized value to the set of keys that have this value."""
+
+    def __init__(self, normalize=None):
+        self.normalize = normalize or (lambda value: value)
+        # Значення з одним власником(а це майже всі номери) зберігає сам ключ
+        # замість множини з одного елемента - так індекс займає значно менше пам'яті
+        self._keys = {}
+        # Для кожного ключа зберігаються його значення, щоб при зміні
+        # запису прибрати саме ті значення, що були додані раніше
+        self._values = {}
+
+    def add(self, key, values):
+        """Index values under key. Values indexed for this key earlier are replaced."""
+        self.remove(key)
+        values = tuple({self.normalize(value) for value in values})
+        if not values:
+            return
+        self._values[key] = values
+        for value in values:
+            keys = self._keys.get(value)
+            if keys is None:
+                self._keys[value] = key
+            elif isinstance(keys, set):
+                keys.add(key)
+            else:
+                self._keys[value] = {keys, key}
+
+    def remove(self, key):
+        for value in self._values.pop(key, ()):
+            keys = self._keys[value]
+            if not isinstance(keys, set):
+                del self._keys[value]
+                continue
+            keys.discard(key)
+            if len(keys) == 1:
+                self._keys[value] = keys.pop()
+
+    def get(self, value):
+        keys = self._keys.get(self.normalize(value))
+        if keys is None:
+            return set()
+        return set(keys) if isinstance(keys, set) else {keys}
+
+
+class LRUCache:
+    """Cache of limited size. When it is full, the least recently used entry is evicted.
+    Every operation takes a lock, so the cache can be used from several threads."""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        # Навіть читання з кешу змінює порядок записів та лічильники
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Return cached value or None if there is no value for the key."""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, predicate):
+        """Remove all entries whose key matches the predicate."""
+        with self._lock:
+            stale = [key for key in self._entries if predicate(key)]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def counts(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "invalidations": self.invalidations, "size": len(self._entries)}
+
+
+class SortedIndex:
+    """List of (value, key) pairs kept in order of value."""
+
+    # Скільки нових пар вставляється по одній, а не повним сортуванням
+    insert_limit = 64
+
+    def __init__(self):
+        self._entries = []
+        self._values = {}
+        # Кількість пар на початку списку, що вже впорядковані
+        self._sorted_count = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, key, value):
+        """Index key under value. None values are not indexed."""
+        self.remove(key)
+        if value is None:
+            return
+        self._values[key] = value
+        # Нові пари просто додаються в кінець, а список сортується перед наступним
+        # запитом. Так завантаження книги коштує одне сортування, а не вставку
+        # кожного запису в середину списку
+        self._entries.append((value, key))
+
+    def remove(self, key):
+        if key not in self._values:
+            return
+        self._ensure_sorted()
+        entry = (self._values.pop(key), key)
+        del self._entries[bisect_left(self._entries, entry)]
+        self._sorted_count -= 1
+
+    def sort(self):
+        """Sort the pairs added since the last query. Queries sort them on their own,
+        so this is only needed when the index is read from several threads at once."""
+        self._ensure_sorted()
+
+    def _ensure_sorted(self):
+        entries = self._entries
+        unsorted = len(entries) - self._sorted_count
+        if not unsorted:
+            return
+        # Кілька нових пар(зміна окремих записів) вставляються на свої місця бінарним
+        # пошуком. Після масового додавання(завантаження книги) список сортується
+        # повністю - він майже впорядкований, тому сортування Timsort тут лінійне
+        if unsorted <= self.insert_limit:
+            tail = entries[self._sorted_count:]
+            del entries[self._sorted_count:]
+            for entry in tail:
+                insort(entries, entry)
+        else:
+            entries.sort()
+        self._sorted_count = len(entries)
+
+    def _bounds(self, low, high):
+        self._ensure_sorted()
+        start = 0 if low is None else bisect_left(self._entries, (low,))
+        stop = len(self._entries) if high is None else bisect_left(self._entries, (high,))
+        return start, stop
+
+    def count_between(self, low=None, high=None):
+        """Return number of pairs with low <= value < high. None means no bound."""
+        start, stop = self._bounds(low, high)
+        return max(stop - start, 0)
+
+    def iter_between(self, low=None, high=None, after=None):
+        """Yield (value, key) pairs with low <= value < high. If after is given,
+        start right after this (value, key) pair."""
+        start, stop = self._bounds(low, high)
+        if after is not None:
+            # Пошук за ключем, а не пропуск певної кількості пар: продовження з місця,
+            # де зупинилися, коштує O(log n) незалежно від номера сторінки
+            start = max(start, bisect_right(self._entries, after))
+        entries = self._entries
+        for i in range(start, stop):
+            yield entries[i]
+
+    def iter_from(self, value, wrap=False):
+        """Yield (value, key) pairs starting from the first value >= value.
+        If wrap is True, continue from the beginning after the end is reached."""
+        self._ensure_sorted()
+        entries = self._entries
+        start = bisect_left(entries, (value,))
+        # Обхід за індексами не копіює список, на відміну від зрізів
+        for i in range(start, len(entries)):
+            yield entries[i]
+        if wrap:
+            for i in range(start):
+                yield entries[i]
+
+
+class FuzzyIndex:
+    """Index for typo-tolerant search. Texts are split into trigrams of the lowercased
+    text padded with spaces, candidates are the keys that share the most trigrams with
+    the query, and only the candidates are scored with SequenceMatcher."""
+
+    def __init__(self, n=3, candidates=200):
+        self.n = n
+        # Скільки найкращих за спільними n-грамами ключів оцінюється точно
+        self.candidates = candidates
+        self._postings = defaultdict(set)
+        self._texts = {}
+
+    def _grams(self, text):
+        # Пробіли на початку та в кінці дають n-грами для перших та останніх
+        # літер, тому помилка на краю слова важить не менше, ніж у середині
+        text = " " * (self.n - 1) + text + " "
+        return {text[i:i + self.n] for i in range(len(text) - self.n + 1)}
+
+    def add(self, key, text):
+        """Index text under key. The text indexed for this key earlier is replaced."""
+        self.remove(key)
+        text = text.lower()
+        self._texts[key] = text
+        for gram in self._grams(text):
+            self._postings[gram].add(key)
+
+    def remove(self, key):
+        text = self._texts.pop(key, None)
+        if text is None:
+            return
+        for gram in self._grams(text):
+            keys = self._postings.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[gram]
+
+    def search(self, text, limit=5, cutoff=0.5):
+        """Return up to limit (similarity, key) pairs with similarity >= cutoff,
+        the most similar first. Similarity is between 0 and 1."""
+        text = text.lower()
+        grams = self._grams(text)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._postings.get(gram, ()))
+        # Коефіцієнт Дайса за n-грамами дешевий, тому ним відбираються кандидати,
+        # а точніша, але повільна оцінка SequenceMatcher рахується лише для них
+        texts = self._texts
+        candidates = heapq.nlargest(
+            self.candidates, shared.items(),
+            key=lambda item: 2 * item[1] / (len(grams) + len(texts[item[0]]) + 1))
+        matcher = SequenceMatcher(autojunk=False)
+        # SequenceMatcher кешує інформацію про другу послідовність, тому запит іде другим
+        matcher.set_seq2(text)
+        scored = []
+        for key, _ in candidates:
+            matcher.set_seq1(texts[key])
+            if matcher.real_quick_ratio() >= cutoff and matcher.quick_ratio() >= cutoff:
+                ratio = matcher.ratio()
+                if ratio >= cutoff:
+                    scored.append((ratio, key))
+        # При однаковій схожості ключі йдуть за алфавітом
+        return heapq.nsmallest(limit, scored, key=lambda item: (-item[0], item[1]))
@@ -1,10 +1,8 @@
-import logging
-import re
-
-from fuzzywuzzy import fuzz, process
-import readline
+import sys
+import time
 
 import classes
+import handlers
 from handlers import commands
 
 
@@ -15,7 +13,8 @@ from handlers import commands
 def completer(text, state):
     if not text.isalpha():
         return None
-    options = [cmd for cmd in commands.keys() if cmd.startswith(text.lower())]
+    # Список команд з таким префіксом вже зберігається у дереві команд
+    options = commands.complete(text)
     if not options:
         return None
     if state < len(options):
@@ -23,22 +22,19 @@ def completer(text, state):
     return None
 
 
+def split_command(user_input: str):
+    """Take as input user input. Return command name and list of arguments.
+    Raise IndexError if the input is empty."""
+    # Команди зберігаються у дереві префіксів, тому команди з кількох слів
+    # (good bye, show all, del phone, del user) розпізнаються за один прохід.
+    # Командою вважається найдовша команда, з якої починається ввід,
+    # а аргументами - всі наступні слова
+    return commands.resolve(user_input)
+
+
 def parse_command(user_input: str):
-    # Даний регулярний вираз шукає команди, що складаються більше, ніж з одного слова.
-    # Тобто це good bye, show all, del phone та del user.
-    # Якщо користувач ввів одну із цих команд, командою вважатимуться перші два слова,
-    # а аргументами - все, починаючи з третього. Я
-    # кщо ж команда складаєтсья з одного слова(блок else),
-    # то аргументами є все, починаючи з другого елементу
-    match = re.search(
-        r"^show\s|^good\s|^del\s", user_input.lower())
     try:
-        if match:
-            user_command = " ".join(user_input.split()[:2]).lower()
-            command_arguments = user_input.split()[2:]
-        else:
-            user_command = user_input.split()[0].lower()
-            command_arguments = user_input.split()[1:]
+        user_command, command_arguments = split_command(user_input)
     except IndexError:
         return "Please enter a command name."
 
@@ -49,10 +45,17 @@ def parse_command(user_input: str):
     # вводу користувача(за це відповідає змінна match_ratio
     # та коефіцієнт 60, виведений експерементальним шляхом),
     # повернеться повідомлення про те що команду не знайдено.
-    if user_command not in commands.keys():
+    # Подібність рахується лише для команд, що відрізняються від вводу кількома
+    # символами. Лише якщо таких немає, ввід порівнюється з усіма командами
+    if user_command not in commands:
+        # fuzzywuzzy потрібен лише для помилково введених команд, тому
+        # імпортується тут, а не при запуску програми
+        import logging
+        from fuzzywuzzy import fuzz, process
         logging.basicConfig(level=logging.ERROR)
+        candidates = commands.candidates(user_command) or commands.keys()
         best_match, match_ratio = process.extractOne(user_command,
-                                                     commands.keys(),
+                                                     candidates,
                                                      scorer=fuzz.ratio)
         if match_ratio >= 60:
             return f"Command not found.\nPerhaps you meant '{best_match}'."
@@ -62,30 +65,169 @@ def parse_command(user_input: str):
         return commands[user_command](*command_arguments)
 
 
-def main():
+def main(record_file=None):
+    import readline
     # Ці дві лінійки безпосередньо пов'язані з функцією completer.
     # Вони відповідають за те, при натисканні на яку кнопку відбуватиметься автодоповнення.
     readline.set_completer(completer)
     readline.parse_and_bind("tab: complete")
 
+    # Якщо задано record_file, усі введені команди дописуються у цей файл.
+    # Такий журнал можна виконати у режимі --batch або відтворити у replay.py
+    record = open(record_file, "a", encoding="utf-8", buffering=1) if record_file else None
+
+    # Поки програма чекає на ввід, зміни зберігає фоновий таймер сесії.
+    # Команда виконується під блокуванням сесії, щоб таймер не зберігав книгу
+    # посеред її зміни
+    handlers.session.start_flush_timer()
     while True:
         user_input = input("Enter command: ")
-        result = parse_command(user_input)
+        if record is not None and user_input.strip():
+            record.write(user_input.strip() + "\n")
+        with handlers.session.lock:
+            result = parse_command(user_input)
 
         if result:
-            # Якщо повернули ітератор(тобто команда show all), проходимося по ньому в циклі,
-            #  поступово показуючи записи
-            if isinstance(result, classes.AddressBook):
+            # Якщо повернули ітератор по сторінках(тобто команда show all), проходимося
+            # по ньому в циклі, поступово показуючи записи. Замість переходу на наступну
+            # сторінку можна ввести номер сторінки, на яку потрібно перейти
+            if isinstance(result, classes.PageCursor):
                 for page in result:
                     commands["clear"]()
                     print("\n".join([str(i) for i in page]))
-                    user_input = input(
-                        "Press 'q' to quit. Press any key to see the next page: ")
+                    print(f"Page {result.current_page - 1} of {result.page_count}")
+                    user_input = input("Press 'q' to quit. Enter page number to jump to it. "
+                                       "Press any key to see the next page: ")
                     if user_input.lower() == "q":
                         break
+                    if user_input.isdigit() and int(user_input) > 0:
+                        result.seek(int(user_input))
             else:
                 print(result)
 
 
+def format_result(result):
+    """Return result of a command as one string. Pages of show all are joined together."""
+    if isinstance(result, classes.PageCursor):
+        return "\n".join(str(record) for page in result for record in page)
+    return "" if result is None else str(result)
+
+
+# Команди, що мають сенс лише в інтерактивному режимі
+INTERACTIVE_COMMANDS = ("clear",)
+
+
+def run_batch(lines, commit_every=0, output=None):
+    """Take as input iterable of command lines. Run all commands against one session
+    and print one JSON object per command and the total throughput."""
+    import json
+    output = output or sys.stdout
+    session = handlers.session
+    # Зміни зберігаються лише кожні commit_every команд та наприкінці,
+    # а не за таймером сесії
+    session.flush_interval = float("inf")
+    executed = 0
+    start = time.perf_counter()
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        # Порожні рядки та коментарі у скрипті пропускаються
+        if not line or line.startswith("#"):
+            continue
+        command_start = time.perf_counter()
+        answer = {"line": line_number, "command": line}
+        try:
+            if split_command(line)[0] in INTERACTIVE_COMMANDS:
+                continue
+            answer["result"] = format_result(parse_command(line))
+        except SystemExit:
+            # Команда exit у скрипті завершує виконання скрипта
+            break
+        except Exception as error:
+            # Помилка однієї команди не повинна зупиняти весь скрипт,
+            # вона записується у результат цієї команди
+            answer["error"] = f"{type(error).__name__}: {error}"
+        executed += 1
+        answer["ms"] = round((time.perf_counter() - command_start) * 1000, 3)
+        print(json.dumps(answer, ensure_ascii=False), file=output)
+        if commit_every and executed % commit_every == 0:
+            session.save()
+    session.save()
+    total = time.perf_counter() - start
+    print(json.dumps({"commands": executed, "seconds": round(total, 3),
+                      "commands_per_second": round(executed / total, 1) if total else 0}),
+          file=output)
+
+
+# Допустимий час імпорту програми при запуску у мілісекундах
+STARTUP_BUDGET_MS = 100
+# Скільки найповільніших модулів показується у звіті --profile-startup
+STARTUP_REPORT_LIMIT = 15
+
+
+def profile_startup(budget=STARTUP_BUDGET_MS, limit=STARTUP_REPORT_LIMIT):
+    """Import main in a new interpreter with -X importtime and print the slowest
+    modules. Return True if the whole import fits into the budget in milliseconds,
+    False if it doesn't or if the import fails."""
+    import os
+    import subprocess
+    # Імпорт виконується з директорії програми, щоб main знайшовся незалежно
+    # від того, звідки запущено профілювання
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                             capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+    if process.returncode:
+        # Якщо імпорт впав, у звіті були б лише модулі інтерпретатора, і бюджет
+        # вважався б виконаним, хоча нічого не виміряно
+        print(process.stderr.splitlines()[-1] if process.stderr else "Import of main failed.")
+        return False
+    # Рядки мають вигляд "import time:  self [us] | cumulative | imported package",
+    # вкладеність модуля позначається відступом перед назвою
+    modules = []
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        own, cumulative, name = line.split(":", 1)[1].split("|")
+        if not own.strip().isdigit():
+            continue
+        modules.append((int(cumulative), int(own), name.rstrip()))
+    # Загальний час - це сума кумулятивного часу модулів верхнього рівня
+    total = sum(cumulative for cumulative, _, name in modules
+                if not name.startswith("  ")) / 1000
+    print(f"{'cumulative ms':>14}{'self ms':>10}  module")
+    for cumulative, own, name in sorted(modules, reverse=True)[:limit]:
+        print(f"{cumulative / 1000:>14.2f}{own / 1000:>10.2f}  {name.strip()}")
+    print(f"Total import time: {total:.2f} ms, budget: {budget} ms.")
+    return total <= budget
+
+
+def cli():
+    import argparse
+    parser = argparse.ArgumentParser(description="Address book assistant bot.")
+    parser.add_argument("--batch", metavar="FILE", nargs="?", const="-",
+                        help="run commands from FILE (or from stdin) without interaction")
+    parser.add_argument("--commit-every", metavar="N", type=int, default=0,
+                        help="in batch mode save changes every N commands, not only at the end")
+    parser.add_argument("--stats-file", metavar="FILE",
+                        help="write command metrics to FILE on exit "
+                             "(JSON if FILE ends with .json, Prometheus text otherwise)")
+    parser.add_argument("--record", metavar="FILE",
+                        help="in interactive mode append every entered command to FILE")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print import time of the slowest modules and exit, "
+                             f"exit code is 1 if startup takes more than {STARTUP_BUDGET_MS} ms")
+    args = parser.parse_args()
+    if args.profile_startup:
+        sys.exit(0 if profile_startup() else 1)
+    handlers.STATS_FILE = args.stats_file
+
+    if args.batch is None:
+        main(args.record)
+    elif args.batch == "-":
+        run_batch(sys.stdin, args.commit_every)
+    else:
+        with open(args.batch, encoding="utf-8") as file:
+            run_batch(file, args.commit_every)
+
+
 if __name__ == "__main__":
-    main()
+    cli()
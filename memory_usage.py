@@ -0,0 +1,57 @@
+"""Measure how many bytes one contact takes in memory
+in the regular and in the compact storage mode.
+
+Usage: python memory_usage.py [number of contacts]
+"""
+import sys
+import tracemalloc
+
+import classes
+
+
+def generate_contacts(count):
+    # Синтетичні контакти: ім'я, два номери телефону(один з +) та день народження
+    for i in range(count):
+        yield (f"User{i:07d}",
+               [str(100000000000 + i * 7), f"+{200000000000 + i * 13}"],
+               f"{i % 28 + 1:02}.{i % 12 + 1:02}.{1950 + i % 60}")
+
+
+def make_record(name, phones, birthday):
+    return classes.Record(classes.Name(name),
+                          [classes.Phone(phone) for phone in phones],
+                          classes.Birthday(birthday))
+
+
+def measure(count, compact_storage, with_indexes):
+    """Return number of bytes per contact."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    if with_indexes:
+        data = classes.AddressBook(compact_storage=compact_storage)
+        for contact in generate_contacts(count):
+            data.add_record(make_record(*contact))
+    else:
+        # Без адресної книги вимірюються лише самі записи, без словника та індексів
+        data = [make_record(*contact) for contact in generate_contacts(count)]
+        if compact_storage:
+            data = [classes.CompactRecord.from_record(record) for record in data]
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del data
+    return used / count
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    print(f"Contacts: {count}")
+    for with_indexes in (False, True):
+        title = "Records with AddressBook and indexes" if with_indexes else "Records only"
+        regular = measure(count, False, with_indexes)
+        compact = measure(count, True, with_indexes)
+        print(f"{title}: regular {regular:.0f} B/contact, compact {compact:.0f} B/contact "
+              f"({(1 - compact / regular) * 100:.0f}% less)")
+
+
+if __name__ == "__main__":
+    main()
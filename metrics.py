@@ -0,0 +1,166 @@
+"""Per-command metrics: call and error counters and latency histograms
+for the load, compute and save phases of every command, and extra counters
+such as hits and misses of the search cache."""
+from collections import Counter, defaultdict
+import threading
+
+
+# Межі кошиків гістограми у секундах
+BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, float("inf"))
+PHASES = ("load", "compute", "save", "total")
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def cumulative(self):
+        """Return list of (upper bound, number of observations <= bound)."""
+        result, total = [], 0
+        for bound, count in zip(BUCKETS, self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def to_dict(self):
+        return {"count": self.count, "sum": self.sum, "max": self.max,
+                "buckets": {_format_bound(bound): count for bound, count in self.cumulative()}}
+
+
+def percentile(values, percent):
+    """Take as input sorted list of values and percent. Return the value
+    that percent of the values don't exceed."""
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def _format_bound(bound):
+    return "+Inf" if bound == float("inf") else repr(bound)
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+class CommandMetrics:
+    """Call counts, error counts by exception type and latency histograms per command."""
+
+    def __init__(self):
+        self.calls = Counter()
+        self.errors = defaultdict(Counter)
+        self.histograms = defaultdict(Histogram)
+        # {назва: функція, що повертає словник лічильників або None}.
+        # Значення читаються лише при побудові звіту
+        self.counters = {}
+        # У режимі сервера команди виконуються у кількох потоках одночасно
+        self._lock = threading.Lock()
+
+    def observe(self, command, total, load=0.0, save=0.0):
+        """Take as input command name and time in seconds spent on the whole command
+        and on loading and saving the book. The rest of the time is computation."""
+        phases = {"load": load, "compute": max(total - load - save, 0.0),
+                  "save": save, "total": total}
+        with self._lock:
+            self.calls[command] += 1
+            for phase, seconds in phases.items():
+                self.histograms[command, phase].observe(seconds)
+
+    def record_error(self, command, error):
+        with self._lock:
+            self.errors[command][type(error).__name__] += 1
+
+    def counter_values(self):
+        """Return dict {counter group: {counter: value}} of all registered counters."""
+        result = {}
+        for name, source in sorted(self.counters.items()):
+            values = source()
+            if values is not None:
+                result[name] = values
+        return result
+
+    def report(self):
+        """Return metrics as a text table."""
+        counters = [f"{name}: " + ", ".join(f"{key} {value}" for key, value in values.items())
+                    for name, values in self.counter_values().items()]
+        if not self.calls:
+            return "\n".join(["No commands were called yet."] + counters)
+        lines = [f"{'command':<12}{'calls':>7}{'errors':>8}{'avg ms':>10}{'max ms':>10}"
+                 f"{'load ms':>10}{'compute ms':>12}{'save ms':>10}"]
+        for command in sorted(self.calls):
+            calls = self.calls[command]
+            average = {phase: self.histograms[command, phase].sum / calls * 1000
+                       for phase in PHASES}
+            lines.append(f"{command:<12}{calls:>7}{sum(self.errors.get(command, {}).values()):>8}"
+                         f"{average['total']:>10.3f}"
+                         f"{self.histograms[command, 'total'].max * 1000:>10.3f}"
+                         f"{average['load']:>10.3f}{average['compute']:>12.3f}"
+                         f"{average['save']:>10.3f}")
+        for command in sorted(self.errors):
+            errors = ", ".join(f"{name}: {count}" for name, count in self.errors[command].items())
+            lines.append(f"Errors of {command}: {errors}")
+        return "\n".join(lines + counters)
+
+    def to_dict(self):
+        result = {command: {"calls": self.calls[command],
+                            "errors": dict(self.errors.get(command, {})),
+                            "latency": {phase: self.histograms[command, phase].to_dict()
+                                        for phase in PHASES}}
+                  for command in sorted(self.calls)}
+        counters = self.counter_values()
+        if counters:
+            result["counters"] = counters
+        return result
+
+    def to_json(self):
+        import json
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_prometheus(self):
+        """Return metrics in Prometheus text exposition format."""
+        lines = ["# HELP addressbook_command_calls_total Number of command calls.",
+                 "# TYPE addressbook_command_calls_total counter"]
+        for command in sorted(self.calls):
+            lines.append(f'addressbook_command_calls_total{{command="{_label(command)}"}} '
+                         f"{self.calls[command]}")
+        lines += ["# HELP addressbook_command_errors_total Number of command errors by type.",
+                  "# TYPE addressbook_command_errors_total counter"]
+        for command in sorted(self.errors):
+            for error, count in sorted(self.errors[command].items()):
+                lines.append(f'addressbook_command_errors_total{{command="{_label(command)}",'
+                             f'error="{_label(error)}"}} {count}')
+        lines += ["# HELP addressbook_command_seconds Command latency by phase.",
+                  "# TYPE addressbook_command_seconds histogram"]
+        for command in sorted(self.calls):
+            for phase in PHASES:
+                histogram = self.histograms[command, phase]
+                labels = f'command="{_label(command)}",phase="{phase}"'
+                for bound, count in histogram.cumulative():
+                    lines.append(f'addressbook_command_seconds_bucket{{{labels},'
+                                 f'le="{_format_bound(bound)}"}} {count}')
+                lines.append(f"addressbook_command_seconds_sum{{{labels}}} {histogram.sum}")
+                lines.append(f"addressbook_command_seconds_count{{{labels}}} {histogram.count}")
+        # Лічильники обнуляються разом з об'єктом, що їх веде(наприклад, кеш - при
+        # перечитуванні книги), тому вони експортуються як gauge, а не counter
+        for name, values in self.counter_values().items():
+            for key, value in values.items():
+                metric = f"addressbook_{name}_{key}"
+                lines += [f"# TYPE {metric} gauge", f"{metric} {value}"]
+        return "\n".join(lines) + "\n"
+
+    def dump(self, filename):
+        """Write metrics to the file: JSON if the filename ends with .json,
+        Prometheus text format otherwise."""
+        content = self.to_json() if filename.endswith(".json") else self.to_prometheus()
+        with open(filename, "w", encoding="utf-8") as file:
+            file.write(content)
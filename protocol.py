@@ -0,0 +1,7 @@
+"""Settings shared by the address book server and its client.
+
+The module imports nothing, so the client can use it without loading the server,
+the handlers and the address book session."""
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
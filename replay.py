@@ -0,0 +1,185 @@
+"""Replay of an operator session for end-to-end throughput testing.
+
+Commands go through main.parse_command, the handlers and the session with its file
+persistence, exactly as in the interactive mode. The commands are taken from a log
+written with `main.py --record FILE` (or any --batch script), or generated as a mix
+of add/search/phone/change/del commands over the names in the book.
+
+Usage:
+    python replay.py --data data.csv --log commands.log [--profile replay.prof]
+    python replay.py --data data.csv --generate 10000 [--seed 0] [--in-place]
+
+By default the data file is copied to a temporary directory, so the replay doesn't
+change it. For every command the p50/p95/p99 latency is reported, and the throughput
+of the whole replay including the final save.
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import classes
+import handlers
+import main
+from metrics import percentile
+
+
+# Частка кожної команди у згенерованій суміші
+COMMAND_MIX = {"add": 0.2, "search": 0.3, "phone": 0.25, "change": 0.15, "del user": 0.1}
+PERCENTILES = (50, 95, 99)
+# Скільки найповільніших функцій показується з профілю
+PROFILE_LIMIT = 25
+
+
+def read_log(filename):
+    """Return list of commands from the log. Empty lines and comments are skipped."""
+    with open(filename, encoding="utf-8") as file:
+        return [line.strip() for line in file
+                if line.strip() and not line.lstrip().startswith("#")]
+
+
+def generate_commands(book, count, seed=0):
+    """Return list of count commands. The mix follows COMMAND_MIX, commands refer
+    to the names that exist in the book at the moment the command runs."""
+    generator = random.Random(seed)
+    # Телефони всіх записів відстежуються тут, щоб команди change та del
+    # посилалися на записи та номери, що справді існують на момент виконання
+    phones = {}
+    for record in book.records():
+        if record.phones:
+            phones[record.name.value] = record.phones[0].value
+    names = list(phones)
+    positions = {name: i for i, name in enumerate(names)}
+    kinds, weights = zip(*COMMAND_MIX.items())
+    result = []
+    for i in range(count):
+        kind = generator.choices(kinds, weights)[0]
+        if kind == "add" or not names:
+            name, phone = f"Replay{seed}x{i}", str(380_000_000_000 + generator.randrange(10 ** 9))
+            result.append(f"add {name} {phone}")
+            if name not in phones:
+                positions[name] = len(names)
+                names.append(name)
+            phones[name] = phone
+            continue
+        name = generator.choice(names)
+        if kind == "search":
+            if generator.random() < 0.5:
+                result.append(f"search name {name[:generator.randint(2, 5)]}")
+            else:
+                result.append(f"search phone {phones[name][-generator.randint(3, 6):]}")
+        elif kind == "phone":
+            result.append(f"phone {name}")
+        elif kind == "change":
+            phone = str(380_000_000_000 + generator.randrange(10 ** 9))
+            result.append(f"change {name} {phones[name]} {phone}")
+            phones[name] = phone
+        else:
+            result.append(f"del user {name}")
+            # Видалене ім'я міняється місцями з останнім у списку і прибирається за O(1)
+            last = names[-1]
+            names[positions[name]] = last
+            positions[last] = positions[name]
+            names.pop()
+            del positions[name], phones[name]
+    return result
+
+
+def replay(lines, commit_every=0):
+    """Run the commands against handlers.session. Return ({command: [seconds]},
+    total seconds). The final save is included in the total time."""
+    session = handlers.session
+    if commit_every:
+        # Зміни зберігаються кожні commit_every команд, а не за таймером сесії
+        session.flush_interval = float("inf")
+    latencies = {}
+    start = time.perf_counter()
+    for executed, line in enumerate(lines, 1):
+        command = main.split_command(line)[0]
+        if command in main.INTERACTIVE_COMMANDS:
+            continue
+        command_start = time.perf_counter()
+        try:
+            main.format_result(main.parse_command(line))
+        except SystemExit:
+            break
+        latencies.setdefault(command, []).append(time.perf_counter() - command_start)
+        if commit_every and executed % commit_every == 0:
+            session.save()
+    session.save()
+    return latencies, time.perf_counter() - start
+
+
+def report(latencies, seconds):
+    lines = [f"{'command':<16}{'count':>8}" + "".join(f"{f'p{p} ms':>10}" for p in PERCENTILES)]
+    total = 0
+    for command, values in sorted(latencies.items()):
+        values.sort()
+        total += len(values)
+        lines.append(f"{command:<16}{len(values):>8}"
+                     + "".join(f"{percentile(values, p) * 1000:>10.3f}" for p in PERCENTILES))
+    lines.append(f"{total} commands in {seconds:.2f} s: "
+                 f"{total / seconds if seconds else 0:.0f} commands/s")
+    return "\n".join(lines)
+
+
+def _copy_data(filename, directory):
+    # Копіюються основний файл, журнал змін та файли SQLite, або вся директорія шардів
+    destination = os.path.join(directory, os.path.basename(filename.rstrip(os.sep)))
+    if os.path.isdir(filename):
+        shutil.copytree(filename, destination)
+        return destination
+    for suffix in ("", ".journal", "-wal", "-shm"):
+        if os.path.exists(filename + suffix):
+            shutil.copy2(filename + suffix, destination + suffix)
+    return destination
+
+
+def run(args, directory):
+    filename = args.data if args.in_place else _copy_data(args.data, directory)
+    # Команди працюють з handlers.session, тому вона підміняється сесією для файлу
+    handlers.session = classes.AddressBookSession(
+        filename, handlers.FLUSH_INTERVAL, handlers.COMPACT_THRESHOLD, handlers.COMPACT_STORAGE)
+    if args.log:
+        lines = read_log(args.log)
+    else:
+        lines = generate_commands(handlers.session.book, args.generate, args.seed)
+    # Книга завантажується до початку вимірювань, як у вже запущеній програмі
+    handlers.session.book
+    if not args.profile:
+        return replay(lines, args.commit_every)
+    import cProfile
+    import pstats
+    profile = cProfile.Profile()
+    result = profile.runcall(replay, lines, args.commit_every)
+    profile.dump_stats(args.profile)
+    pstats.Stats(profile, stream=sys.stderr).sort_stats("cumulative").print_stats(PROFILE_LIMIT)
+    return result
+
+
+def cli():
+    parser = argparse.ArgumentParser(description="Replay commands and measure their latency.")
+    parser.add_argument("--data", default=handlers.DATA_FILE,
+                        help="address book file (csv, .db or directory with shards)")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--log", metavar="FILE", help="commands recorded with main.py --record")
+    source.add_argument("--generate", metavar="N", type=int, help="generate N commands")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the generated commands")
+    parser.add_argument("--commit-every", metavar="N", type=int, default=0,
+                        help="save changes every N commands instead of the session timer")
+    parser.add_argument("--in-place", action="store_true",
+                        help="change the data file itself instead of its temporary copy")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="profile the replay with cProfile, save the stats to FILE "
+                             "and print the hottest functions")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        latencies, seconds = run(args, directory)
+    print(report(latencies, seconds))
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,217 @@
+"""Server mode: one address book in memory shared by many clients.
+
+The server listens on a TCP or Unix socket. Every line from a client is a command,
+the same as in the interactive mode, and the answer is one JSON line
+{"result": "..."}. Commands that only read the book run concurrently in a thread pool,
+commands that change it run one at a time, while no reader is active. A book stored
+in SQLite is served by one thread that owns the database connection. Changes are
+saved by a background task every flush interval and when the server stops.
+
+Usage:
+    python server.py [--host 127.0.0.1] [--port 8765] [--unix PATH]
+                     [--data data.csv] [--flush-interval 5]
+"""
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import signal
+
+import classes
+import handlers
+from handlers import commands
+import main
+from protocol import DEFAULT_HOST, DEFAULT_PORT
+
+
+FLUSH_INTERVAL = 5
+# Команди, що змінюють книгу або файл. Решта команд лише читають і виконуються
+# одночасно, тому не повинні змінювати спільний стан: індекси досортовуються після
+# кожної зміни, кеш пошуку та метрики захищені власними блокуваннями
+WRITE_COMMANDS = ("add", "change", "del user", "del phone", "import", "save", "dedupe")
+# Команди, що завершують з'єднання клієнта, а не весь сервер
+EXIT_COMMANDS = ("exit", "close", "good bye")
+
+
+class ReadWriteLock:
+    """Asyncio lock that lets many readers or one writer in at a time.
+    A waiting writer stops new readers from entering, so writes are not starved."""
+
+    def __init__(self):
+        self._condition = asyncio.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    async def acquire_read(self):
+        async with self._condition:
+            await self._condition.wait_for(
+                lambda: not self._writer and not self._waiting_writers)
+            self._readers += 1
+
+    async def release_read(self):
+        async with self._condition:
+            self._readers -= 1
+            if not self._readers:
+                self._condition.notify_all()
+
+    async def acquire_write(self):
+        async with self._condition:
+            self._waiting_writers += 1
+            try:
+                await self._condition.wait_for(lambda: not self._writer and not self._readers)
+            finally:
+                self._waiting_writers -= 1
+            self._writer = True
+
+    async def release_write(self):
+        async with self._condition:
+            self._writer = False
+            self._condition.notify_all()
+
+
+class AddressBookServer:
+    def __init__(self, session, flush_interval=FLUSH_INTERVAL, workers=None):
+        self.session = session
+        self.flush_interval = flush_interval
+        # Сервер сам зберігає зміни фоновим завданням, тому таймер сесії вимикається.
+        # Файл перевіряється на зміни теж лише фоновим завданням під блокуванням на
+        # запис: перечитування книги посеред читання зламало б інші потоки
+        self.session.flush_interval = float("inf")
+        self.session.watch_file = False
+        self.lock = ReadWriteLock()
+        # З'єднання SQLite можна використовувати лише у потоці, що його створив,
+        # а спільне з'єднання змішало б транзакції різних команд. Тому для книги
+        # в SQLite усі команди виконуються в одному потоці, де з'єднання і відкривається
+        if session.uses_sqlite:
+            workers = 1
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    def _execute(self, line):
+        # PageCursor команди show all читається тут же, поки утримується блокування
+        return main.format_result(main.parse_command(line))
+
+    def _execute_write(self, line):
+        try:
+            return self._execute(line)
+        finally:
+            self._prepare_reads()
+
+    def _prepare_reads(self):
+        # Після зміни індекси книги досортовуються ще під блокуванням на запис.
+        # Інакше їх сортував би перший читач, поки інші читачі по них ідуть
+        self.session.book.sort_indexes()
+
+    def _refresh_and_save(self):
+        self.session.refresh()
+        self._prepare_reads()
+        self.session.save()
+
+    async def execute(self, line):
+        """Run one command line and return its result as a string."""
+        loop = asyncio.get_running_loop()
+        command = commands.resolve(line)[0]
+        if command in WRITE_COMMANDS:
+            await self.lock.acquire_write()
+            try:
+                return await loop.run_in_executor(self.executor, self._execute_write, line)
+            finally:
+                await self.lock.release_write()
+        await self.lock.acquire_read()
+        try:
+            return await loop.run_in_executor(self.executor, self._execute, line)
+        finally:
+            await self.lock.release_read()
+
+    async def save(self):
+        """Read the book again if the file was changed by someone else and save
+        the changes. Both happen under the write lock."""
+        await self.lock.acquire_write()
+        try:
+            await asyncio.get_running_loop().run_in_executor(self.executor,
+                                                             self._refresh_and_save)
+        finally:
+            await self.lock.release_write()
+
+    async def flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.save()
+
+    async def handle_client(self, reader, writer):
+        try:
+            while line := await reader.readline():
+                line = line.decode("utf-8").strip()
+                if not line:
+                    continue
+                try:
+                    command = commands.resolve(line)[0]
+                    if command in EXIT_COMMANDS:
+                        writer.write(b'{"result": "Good bye!"}\n')
+                        break
+                    if command in main.INTERACTIVE_COMMANDS:
+                        answer = {"result": ""}
+                    else:
+                        answer = {"result": await self.execute(line)}
+                except Exception as error:
+                    # Помилка однієї команди не повинна розривати з'єднання
+                    answer = {"error": f"{type(error).__name__}: {error}"}
+                writer.write(json.dumps(answer, ensure_ascii=False).encode("utf-8") + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_path=None):
+        # Книга завантажується до прийому з'єднань, а не при першому запиті.
+        # Завантаження йде у потоці виконавця, бо там же працюватимуть команди
+        await asyncio.get_running_loop().run_in_executor(self.executor, self._prepare_reads)
+        if unix_path:
+            server = await asyncio.start_unix_server(self.handle_client, unix_path)
+        else:
+            server = await asyncio.start_server(self.handle_client, host, port)
+        address = unix_path or f"{host}:{port}"
+        print(f"Address book server is listening on {address}.", flush=True)
+        flusher = asyncio.create_task(self.flush_periodically())
+        # При SIGTERM сервер зупиняється так само, як при Ctrl+C, і зберігає зміни.
+        # На Windows обробники сигналів у asyncio не підтримуються
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM,
+                                                          asyncio.current_task().cancel)
+        except NotImplementedError:
+            pass
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            flusher.cancel()
+            await self.save()
+            self.executor.shutdown()
+            if unix_path and os.path.exists(unix_path):
+                os.remove(unix_path)
+
+
+def cli():
+    parser = argparse.ArgumentParser(description="Serve one address book to many clients.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead of TCP")
+    parser.add_argument("--data", default=handlers.DATA_FILE, help="address book file")
+    parser.add_argument("--flush-interval", type=float, default=FLUSH_INTERVAL,
+                        help="save changes every N seconds")
+    args = parser.parse_args()
+    # Команди працюють з handlers.session, тому сервер підміняє її сесією для свого файлу
+    handlers.session = classes.AddressBookSession(
+        args.data, compact_threshold=handlers.COMPACT_THRESHOLD,
+        compact_storage=handlers.COMPACT_STORAGE)
+    server = AddressBookServer(handlers.session, args.flush_interval)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,173 @@
+"""Address book split into several csv files (shards) in one directory.
+
+A record goes to shard crc32(name) % N. Shards are read in parallel by a process
+pool and merged into one AddressBook. Saving rewrites only the shards that contain
+the changed records. The session uses this layout when its filename is a directory.
+
+Usage:
+    python sharding.py data.csv data --shards 8
+    python sharding.py data data --shards 16
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import csv
+import os
+import re
+import shutil
+import zlib
+
+import classes
+
+
+DEFAULT_SHARDS = 8
+SHARD_NAME = "shard-{:03d}.csv"
+SHARD_PATTERN = re.compile(r"shard-(\d{3})\.csv")
+# Менші книги розбираються в одному процесі: запуск пулу процесів коштує довше,
+# ніж розбір кількох мегабайтів
+PARALLEL_MIN_BYTES = 4 * 2 ** 20
+
+
+def shard_of(name, count):
+    """Return number of the shard for the record with this name."""
+    # crc32 не залежить від PYTHONHASHSEED, на відміну від hash(),
+    # тому запис потрапляє у той самий шард при кожному запуску
+    return zlib.crc32(name.encode("utf-8")) % count
+
+
+def shard_files(directory):
+    """Return list of shard filenames in the directory ordered by shard number."""
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return [os.path.join(directory, name) for name in sorted(names)
+            if SHARD_PATTERN.fullmatch(name)]
+
+
+def shard_number(filename):
+    return int(SHARD_PATTERN.fullmatch(os.path.basename(filename)).group(1))
+
+
+def shard_count(directory):
+    """Return number of shards in the directory: the highest shard number + 1."""
+    # Кількість рахується за номерами, а не за кількістю файлів: якщо один шард
+    # зник, імена все одно мають розподілятися за тим самим модулем
+    numbers = [shard_number(name) for name in shard_files(directory)]
+    return max(numbers) + 1 if numbers else 0
+
+
+def read_shard(filename):
+    """Take as input shard filename. Return list of csv rows of the shard as dicts."""
+    with open(filename, encoding="utf-8", newline="") as file:
+        return list(csv.DictReader(file))
+
+
+def write_shard(filename, records):
+    tmp_filename = f"{filename}.tmp"
+    with open(tmp_filename, "w", newline="", encoding="utf-8") as file:
+        writer = csv.DictWriter(file, fieldnames=classes.AddressBook.fieldnames)
+        writer.writeheader()
+        for record in records:
+            writer.writerow(classes.AddressBook.record_to_row(record))
+    os.replace(tmp_filename, filename)
+
+
+def load(directory, compact_storage=False, workers=None):
+    """Take as input directory with shards. Return AddressBook with records of all shards."""
+    files = shard_files(directory)
+    book = classes.AddressBook(compact_storage=compact_storage)
+    numbers = [shard_number(name) for name in files]
+    book.shard_names = {shard: set() for shard in range(shard_count(directory))}
+    workers = min(workers or os.cpu_count() or 1, len(files))
+    if workers <= 1 or sum(os.path.getsize(name) for name in files) < PARALLEL_MIN_BYTES:
+        return _merge(book, numbers, map(read_shard, files))
+    # Процеси повертають рядки, а не Record: передати між процесами рядки
+    # в кілька разів дешевше, ніж серіалізувати готові об'єкти
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return _merge(book, numbers, executor.map(read_shard, files))
+
+
+def _merge(book, numbers, shards):
+    # Записи та індекси створюються у основному процесі, бо книга з індексами має бути одна.
+    # Заодно запам'ятовується, які імена лежать у кожному шарді
+    for number, rows in zip(numbers, shards):
+        records = list(map(book.record_from_row, rows))
+        book.import_records(records)
+        book.shard_names[number] = {record.name.value for record in records}
+    return book
+
+
+def _shard_names(book, count, names, rebuild=False):
+    # Склад шардів оновлюється лише для змінених імен. Повністю він будується,
+    # коли його ще немає, змінилася кількість шардів або переписуються всі шарди
+    shard_names = getattr(book, "shard_names", None)
+    if rebuild or shard_names is None or len(shard_names) != count:
+        shard_names = {shard: set() for shard in range(count)}
+        for name in book.data:
+            shard_names[shard_of(name, count)].add(name)
+        book.shard_names = shard_names
+        return shard_names
+    for name in names:
+        if name in book.data:
+            shard_names[shard_of(name, count)].add(name)
+        else:
+            shard_names[shard_of(name, count)].discard(name)
+    return shard_names
+
+
+def save(book, directory, names=None, count=None):
+    """Take as input AddressBook, directory and names of changed records.
+    Rewrite only the shards these names belong to, all shards if names is None."""
+    existing = len(shard_files(directory))
+    count = count or shard_count(directory) or DEFAULT_SHARDS
+    os.makedirs(directory, exist_ok=True)
+    # У новій директорії, після зміни кількості шардів або якщо якогось файлу
+    # бракує, записуються всі шарди, навіть порожні
+    rewrite_all = names is None or existing != count
+    if rewrite_all:
+        touched = set(range(count))
+    else:
+        touched = {shard_of(name, count) for name in names}
+    # Записи шарду беруться за його складом, тому збереження кількох змін
+    # не рахує crc32 для кожного запису книги
+    shard_names = _shard_names(book, count, names or (), rewrite_all)
+    for shard in sorted(touched):
+        write_shard(os.path.join(directory, SHARD_NAME.format(shard)),
+                    [book.data[name] for name in sorted(shard_names[shard])])
+
+
+def reshard(source, directory, count=DEFAULT_SHARDS):
+    """Take as input csv file or shard directory and write the book to the directory
+    split into count shards."""
+    if os.path.isdir(source):
+        book = load(source)
+    else:
+        book = classes.AddressBook.open_file(source)
+    # Шарди спочатку записуються у тимчасову директорію, і лише потім вона замінює
+    # стару. Так при падінні посеред запису старі шарди залишаться цілими
+    tmp_directory = f"{directory.rstrip(os.sep)}.tmp"
+    shutil.rmtree(tmp_directory, ignore_errors=True)
+    save(book, tmp_directory, count=count)
+    if os.path.isdir(directory):
+        old_directory = f"{directory.rstrip(os.sep)}.old"
+        os.replace(directory, old_directory)
+        os.replace(tmp_directory, directory)
+        shutil.rmtree(old_directory)
+    else:
+        os.replace(tmp_directory, directory)
+    return len(book.data)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Split the address book into shards or change the number of shards.")
+    parser.add_argument("source", help="csv file or directory with shards")
+    parser.add_argument("destination", help="directory for the shards")
+    parser.add_argument("--shards", type=int, default=DEFAULT_SHARDS)
+    args = parser.parse_args()
+    total = reshard(args.source, args.destination, args.shards)
+    print(f"{total} records written to {args.shards} shards in {args.destination}.")
+
+
+if __name__ == "__main__":
+    main()
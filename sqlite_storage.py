@@ -0,0 +1,344 @@
+"""Address book stored in SQLite.
+
+SQLiteAddressBook has the same methods as AddressBook (add_record, delete_record,
+change_record, search, owners, upcoming_birthdays, pages), so handlers can work with it
+through the session without changes. Every change is a separate short transaction,
+the database works in WAL mode, so readers don't block writers.
+
+Usage:
+    python sqlite_storage.py data.csv data.db
+"""
+import argparse
+from datetime import date
+from itertools import chain
+import sqlite3
+
+import classes
+from indexes import FuzzyIndex
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS contacts (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    -- casefolded name for alphabetical order without case, the same as in AddressBook
+    name_key TEXT NOT NULL,
+    birthday TEXT NOT NULL DEFAULT '',
+    -- month * 100 + day, NULL if there is no birthday
+    birthday_md INTEGER
+);
+CREATE INDEX IF NOT EXISTS contacts_birthday_md ON contacts(birthday_md);
+-- alphabetical order without case for show all and ranges of names
+CREATE INDEX IF NOT EXISTS contacts_name_key ON contacts(name_key, name);
+
+CREATE TABLE IF NOT EXISTS phones (
+    id INTEGER PRIMARY KEY,
+    contact_id INTEGER NOT NULL REFERENCES contacts(id) ON DELETE CASCADE,
+    phone TEXT NOT NULL,
+    normalized TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS phones_contact_id ON phones(contact_id);
+CREATE INDEX IF NOT EXISTS phones_normalized ON phones(normalized);
+"""
+
+# Повнотекстові індекси з токенізатором trigram дозволяють шукати підрядок
+# за індексом. Вони синхронізуються з основними таблицями тригерами
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS contacts_fts USING fts5(
+    name, content='contacts', content_rowid='id', tokenize='trigram case_sensitive 1');
+CREATE TRIGGER IF NOT EXISTS contacts_fts_insert AFTER INSERT ON contacts BEGIN
+    INSERT INTO contacts_fts(rowid, name) VALUES (new.id, new.name);
+END;
+CREATE TRIGGER IF NOT EXISTS contacts_fts_delete AFTER DELETE ON contacts BEGIN
+    INSERT INTO contacts_fts(contacts_fts, rowid, name) VALUES ('delete', old.id, old.name);
+END;
+CREATE TRIGGER IF NOT EXISTS contacts_fts_update AFTER UPDATE OF name ON contacts BEGIN
+    INSERT INTO contacts_fts(contacts_fts, rowid, name) VALUES ('delete', old.id, old.name);
+    INSERT INTO contacts_fts(rowid, name) VALUES (new.id, new.name);
+END;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS phones_fts USING fts5(
+    phone, content='phones', content_rowid='id', tokenize='trigram case_sensitive 1');
+CREATE TRIGGER IF NOT EXISTS phones_fts_insert AFTER INSERT ON phones BEGIN
+    INSERT INTO phones_fts(rowid, phone) VALUES (new.id, new.phone);
+END;
+CREATE TRIGGER IF NOT EXISTS phones_fts_delete AFTER DELETE ON phones BEGIN
+    INSERT INTO phones_fts(phones_fts, rowid, phone) VALUES ('delete', old.id, old.phone);
+END;
+"""
+
+# Скільки записів читається з бази за один запит при посторінковому перегляді
+BATCH_SIZE = 500
+# Мінімальна довжина підрядка, для якої працює токенізатор trigram
+TRIGRAM = 3
+
+
+class SQLiteAddressBook:
+    """Address book stored in SQLite database with indexes for names,
+    phones and birthdays."""
+
+    page_size = classes.AddressBook.page_size
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.connection = sqlite3.connect(filename)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("PRAGMA foreign_keys=ON")
+        with self.connection:
+            self.connection.executescript(SCHEMA)
+        # SQLite може бути зібраний без FTS5. Тоді пошук працює повним переглядом таблиці
+        try:
+            with self.connection:
+                self.connection.executescript(FTS_SCHEMA)
+            self.full_text_search = True
+        except sqlite3.OperationalError:
+            self.full_text_search = False
+        # Індекс для нечіткого пошуку будується в пам'яті при першому пошуку
+        self._fuzzy_names = None
+        self._fuzzy_version = None
+
+    def close(self):
+        self.connection.close()
+
+    # Рядки з таблиці contacts перетворюються на Record. Телефони для всіх
+    # рядків завантажуються одним запитом, а не окремим запитом на кожен запис
+    def _records(self, rows):
+        rows = list(rows)
+        phones = {contact_id: [] for contact_id, *_ in rows}
+        for start in range(0, len(rows), BATCH_SIZE):
+            ids = [row[0] for row in rows[start:start + BATCH_SIZE]]
+            placeholders = ", ".join("?" * len(ids))
+            for contact_id, phone in self.connection.execute(
+                    f"SELECT contact_id, phone FROM phones WHERE contact_id IN ({placeholders}) "
+                    "ORDER BY id", ids):
+                phones[contact_id].append(classes.Phone(phone))
+        result = []
+        for contact_id, name, birthday in rows:
+            record = classes.Record(classes.Name(name), phones[contact_id],
+                                    classes.Birthday(birthday))
+            record.book = self
+            result.append(record)
+        return result
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM contacts").fetchone()[0]
+
+    def __contains__(self, name):
+        return self.connection.execute(
+            "SELECT 1 FROM contacts WHERE name = ?", (name,)).fetchone() is not None
+
+    def __getitem__(self, name):
+        rows = self.connection.execute(
+            "SELECT id, name, birthday FROM contacts WHERE name = ?", (name,)).fetchall()
+        if not rows:
+            raise KeyError(name)
+        return self._records(rows)[0]
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def __setitem__(self, name, record):
+        self.add_record(record)
+
+    def __delitem__(self, name):
+        if name not in self:
+            raise KeyError(name)
+        self.delete_record(classes.Name(name))
+
+    def _save_record(self, record):
+        month_day = record.birthday.month_day
+        self.connection.execute(
+            "INSERT INTO contacts(name, name_key, birthday, birthday_md) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET birthday = excluded.birthday, "
+            "birthday_md = excluded.birthday_md",
+            (record.name.value, record.name.value.casefold(), str(record.birthday),
+             month_day[0] * 100 + month_day[1] if month_day else None))
+        if self._fuzzy_names is not None:
+            self._fuzzy_names.add(record.name.value, record.name.value)
+        self._save_phones(record)
+        record.book = self
+
+    def _save_phones(self, record):
+        contact_id = self.connection.execute(
+            "SELECT id FROM contacts WHERE name = ?", (record.name.value,)).fetchone()[0]
+        self.connection.execute("DELETE FROM phones WHERE contact_id = ?", (contact_id,))
+        self.connection.executemany(
+            "INSERT INTO phones(contact_id, phone, normalized) VALUES (?, ?, ?)",
+            [(contact_id, phone.value, classes.Phone.normalize(phone.value))
+             for phone in record.phones])
+
+    def add_record(self, record):
+        with self.connection:
+            self._save_record(record)
+
+    def delete_record(self, name: classes.Name):
+        with self.connection:
+            self.connection.execute("DELETE FROM contacts WHERE name = ?", (name.value,))
+        if self._fuzzy_names is not None:
+            self._fuzzy_names.remove(name.value)
+
+    def change_record(self, name, new_record):
+        old_name = getattr(name, "value", name)
+        with self.connection:
+            if old_name != new_record.name.value:
+                self.connection.execute("DELETE FROM contacts WHERE name = ?", (old_name,))
+                if self._fuzzy_names is not None:
+                    self._fuzzy_names.remove(old_name)
+            self._save_record(new_record)
+
+    def phones_changed(self, record):
+        """Save the phones of the record after they were changed."""
+        with self.connection:
+            if record.name.value in self:
+                self._save_phones(record)
+
+    def search(self, field: str, text: str) -> list[classes.Record]:
+        if field.lower() == "name":
+            table, column = "contacts", "name"
+            select = "SELECT id, name, birthday FROM contacts c"
+        elif field.lower() == "phone":
+            table, column = "phones", "phone"
+            select = ("SELECT DISTINCT c.id, c.name, c.birthday FROM contacts c "
+                      "JOIN phones p ON p.contact_id = c.id")
+        else:
+            return []
+        alias = "c" if table == "contacts" else "p"
+        if self.full_text_search and len(text) >= TRIGRAM:
+            # Текст береться в лапки, тоді FTS5 шукає його як підрядок, а не як вираз
+            query = '"' + text.replace('"', '""') + '"'
+            rows = self.connection.execute(
+                f"{select} WHERE {alias}.id IN "
+                f"(SELECT rowid FROM {table}_fts WHERE {table}_fts MATCH ?) ORDER BY c.name",
+                (query,))
+        else:
+            rows = self.connection.execute(
+                f"{select} WHERE instr({alias}.{column}, ?) > 0 ORDER BY c.name", (text,))
+        return self._records(rows)
+
+    def fuzzy_search(self, text, limit=5) -> list[tuple[float, classes.Record]]:
+        """Take as input text and number of results. Return up to limit
+        (similarity, record) pairs for names similar to the text, the most similar first."""
+        # data_version змінюється, коли базу змінює інше з'єднання, а власні зміни
+        # оновлюють індекс одразу. Тож індекс перебудовується лише після чужих змін
+        version = self.connection.execute("PRAGMA data_version").fetchone()[0]
+        if self._fuzzy_names is None or version != self._fuzzy_version:
+            self._fuzzy_names = FuzzyIndex()
+            for (name,) in self.connection.execute("SELECT name FROM contacts"):
+                self._fuzzy_names.add(name, name)
+            self._fuzzy_version = version
+        found = self._fuzzy_names.search(text, limit)
+        return [(similarity, self[name]) for similarity, name in found]
+
+    def sort_indexes(self):
+        """Do nothing: the database keeps its indexes itself."""
+
+    def owners(self, phone) -> list[classes.Record]:
+        """Take as input phone number. Return all records with this number."""
+        rows = self.connection.execute(
+            "SELECT DISTINCT c.id, c.name, c.birthday FROM contacts c "
+            "JOIN phones p ON p.contact_id = c.id WHERE p.normalized = ? ORDER BY c.name",
+            (classes.Phone.normalize(phone),))
+        return self._records(rows)
+
+    def upcoming_birthdays(self, days) -> list[tuple[date, classes.Record]]:
+        """Take as input number of days. Return list of (birthday date, record)
+        for all birthdays from today to today + days, ordered by date."""
+        today = date.today()
+        today_md = today.month * 100 + today.day
+        select = "SELECT id, name, birthday, birthday_md FROM contacts WHERE "
+        # Спочатку дні народження від сьогодні до кінця року, потім з початку року.
+        # Рядки йдуть за зростанням дати, тому читання зупиняється на першому,
+        # що не потрапляє у проміжок
+        rows = chain(
+            self.connection.execute(f"{select} birthday_md >= ? ORDER BY birthday_md",
+                                    (today_md,)),
+            self.connection.execute(f"{select} birthday_md < ? ORDER BY birthday_md",
+                                    (today_md,)))
+        result = []
+        for contact_id, name, birthday, month_day in rows:
+            when = classes.next_birthday(month_day // 100, month_day % 100, today)
+            if (when - today).days > days:
+                break
+            result.append((when, (contact_id, name, birthday)))
+        records = self._records(row for _, row in result)
+        return [(when, record) for (when, _), record in zip(result, records)]
+
+    # Межі діапазону імен рахуються так само, як і в AddressBook
+    @staticmethod
+    def _range_condition(start, end):
+        conditions, parameters = [], []
+        low, high = classes.name_bounds(start, end)
+        if low is not None:
+            conditions.append("name_key >= ?")
+            parameters.append(low)
+        if high is not None:
+            conditions.append("name_key < ?")
+            parameters.append(high)
+        return conditions, parameters
+
+    def _iter_records(self, after=None, start=None, end=None):
+        # Пагінація за ключем: кожна наступна порція починається після
+        # останнього отриманого імені, тому запит завжди йде по індексу
+        conditions, parameters = self._range_condition(start, end)
+        while True:
+            where = conditions[:]
+            if after is not None:
+                where.append("(name_key, name) > (?, ?)")
+            query = ("SELECT id, name, birthday FROM contacts "
+                     + ("WHERE " + " AND ".join(where) if where else "")
+                     + " ORDER BY name_key, name LIMIT ?")
+            records = self._records(self.connection.execute(
+                query, parameters + ([after.casefold(), after] if after is not None else [])
+                + [BATCH_SIZE]))
+            if not records:
+                return
+            yield from records
+            after = records[-1].name.value
+
+    def records(self):
+        """Yield all records of the book in alphabetical order. Records are read
+        from the database by BATCH_SIZE at a time."""
+        return self._iter_records()
+
+    def pages(self, page_size=None, start=None, end=None):
+        """Return PageCursor over the records of the book in alphabetical order.
+        If start or end is given, only names from start to end are shown,
+        names that begin with end are included."""
+        conditions, parameters = self._range_condition(start, end)
+        total = self.connection.execute(
+            "SELECT COUNT(*) FROM contacts "
+            + ("WHERE " + " AND ".join(conditions) if conditions else ""), parameters).fetchone()[0]
+        return classes.PageCursor(lambda after=None: self._iter_records(after, start, end), total,
+                                  page_size or self.page_size, key=lambda record: record.name.value)
+
+    def __iter__(self):
+        return self.pages()
+
+    def import_records(self, records):
+        """Add many records in one transaction."""
+        with self.connection:
+            for record in records:
+                self._save_record(record)
+
+
+def csv_to_sqlite(csv_filename, sqlite_filename):
+    data = classes.AddressBook.open_file(csv_filename)
+    book = SQLiteAddressBook(sqlite_filename)
+    book.import_records(data.data.values())
+    book.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Copy the address book from csv to SQLite.")
+    parser.add_argument("source")
+    parser.add_argument("destination")
+    args = parser.parse_args()
+    csv_to_sqlite(args.source, args.destination)
+
+
+if __name__ == "__main__":
+    main()